@@ -0,0 +1,273 @@
+from pathlib import Path
+from typing import Optional, List, Dict, Union
+
+from mmkv_parser import MMKVParser
+
+import os
+import sys
+import json
+import struct
+import sqlite3
+import argparse
+
+"""
+A persistent key index across every MMKV store in a directory (eg. a device extraction), answering
+"which store ever held key X" with a single SQLite probe instead of re-parsing every file.
+Each file is only re-parsed when its size or mtime (or its `.crc` file's) changes.
+
+    python mmkv_index.py build /extraction/files/mmkv --index mmkv_index.sqlite
+    python mmkv_index.py lookup my_key --index mmkv_index.sqlite
+"""
+
+
+class MMKVKeyIndex:
+    """
+    MMKVKeyIndex maps key -> (file, versions, removals, record offsets, live) over many MMKV files,
+    persisted in SQLite. `update_directory()` / `update_file()` refresh only the files that changed.
+    Encrypted stores are indexed when their AES key is passed, otherwise recorded as "encrypted".
+    Files that can't be read are recorded as "unreadable" and retried on the next update.
+    """
+
+    # First bytes of the data region of every MMKV file (the placeholder varint for the item size)
+    ITEM_SIZE_HOLDER = b'\xff\xff\xff\x07'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            crc_state TEXT,
+            status TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            key TEXT NOT NULL,
+            file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            versions INTEGER NOT NULL,
+            removals INTEGER NOT NULL,
+            offsets TEXT NOT NULL,
+            live INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS postings_key ON postings(key);
+        CREATE INDEX IF NOT EXISTS postings_file ON postings(file_id);
+    '''
+
+    def __init__(self, index_path: Union[str, Path] = ':memory:'):
+        """
+        :param index_path: SQLite database file, created if missing. ":memory:" for a throwaway index
+        """
+        self.db = sqlite3.connect(str(index_path))
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _absolute(path: Union[str, Path]) -> Path:
+        # Symlinks are kept as found, so a linked store stays under its directory and is swept with it
+        return Path(os.path.abspath(path))
+
+    @staticmethod
+    def _crc_path(path: Path) -> Optional[Path]:
+        crc_path = path.with_name(path.name + '.crc')
+        return crc_path if crc_path.is_file() else None
+
+    @classmethod
+    def is_mmkv_file(cls, path: Union[str, Path]) -> bool:
+        """
+        Cheap check whether `path` is an MMKV store: it either has a sibling `.crc` file, or starts
+        with a plausible actual size followed by the item size holder.
+
+        :param path: candidate file
+        :return: True if `path` looks like an MMKV file
+        """
+        path = Path(path)
+        if cls._crc_path(path):
+            return True
+        with open(path, 'rb') as f:
+            header = f.read(8)
+        if len(header) < 8 or header[4:8] != cls.ITEM_SIZE_HOLDER:
+            return False
+        return struct.unpack('<I', header[:4])[0] <= path.stat().st_size - 4
+
+    @staticmethod
+    def _crc_state(crc_path: Optional[Path]) -> Optional[str]:
+        if crc_path is None:
+            return None
+        stat = crc_path.stat()
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    def update_file(self, path: Union[str, Path], key: Union[str, bytes, None] = None) -> str:
+        """
+        (Re-)indexes `path` if it changed since it was last indexed.
+
+        :param path: MMKV file; a sibling "<path>.crc" is picked up automatically
+        :param key: AES key (bytes or hexstring) if the store is encrypted
+        :return: "unchanged", "indexed", "encrypted" (no key given), "invalid" or "unreadable"
+        """
+        path = self._absolute(path)
+        row = self.db.execute('SELECT id, size, mtime_ns, crc_state, status FROM files WHERE path = ?',
+                              (str(path),)).fetchone()
+        try:
+            crc_path = self._crc_path(path)
+            stat = path.stat()
+            crc_state = self._crc_state(crc_path)
+        except OSError as e:
+            print(f'[-] Can\'t stat {path}: {e}')
+            # -1 never matches a real size, so the file is retried on the next update
+            self._store(path, row, -1, -1, None, 'unreadable', {})
+            return 'unreadable'
+
+        if row and row[1:4] == (stat.st_size, stat.st_mtime_ns, crc_state) and not (row[4] == 'encrypted' and key):
+            return 'unchanged'
+
+        postings: Dict[str, list] = {}
+        status = 'indexed'
+        try:
+            with open(path, 'rb') as f:
+                crc_file = open(crc_path, 'rb') if crc_path else None
+                try:
+                    mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=crc_file)
+                    if mmkv_parser.meta and mmkv_parser.meta.is_encrypted():
+                        if key is None:
+                            status = 'encrypted'
+                        else:
+                            mmkv_parser.decrypt_and_reconstruct(key)
+                    if status == 'indexed':
+                        for offset, record_key, value_bytes in mmkv_parser.iter_records():
+                            posting = postings.setdefault(record_key, [0, 0, [], False])
+                            posting[2].append(offset)
+                            if value_bytes is None:
+                                posting[1] += 1
+                                posting[3] = False
+                            else:
+                                posting[0] += 1
+                                posting[3] = True
+                except ValueError:
+                    status = 'invalid'
+                finally:
+                    if crc_file:
+                        crc_file.close()
+        except OSError as e:
+            print(f'[-] Can\'t read {path}: {e}')
+            status = 'unreadable'
+            postings = {}
+            stat_size, stat_mtime_ns = -1, -1
+        else:
+            stat_size, stat_mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        self._store(path, row, stat_size, stat_mtime_ns, crc_state, status, postings)
+        return status
+
+    def _store(self, path: Path, row: Optional[tuple], size: int, mtime_ns: int, crc_state: Optional[str],
+               status: str, postings: Dict[str, list]):
+        # Replaces the `files` row (if any) and postings of `path`
+        with self.db:
+            if row:
+                self.db.execute('DELETE FROM postings WHERE file_id = ?', (row[0],))
+                self.db.execute('UPDATE files SET size = ?, mtime_ns = ?, crc_state = ?, status = ? WHERE id = ?',
+                                (size, mtime_ns, crc_state, status, row[0]))
+                file_id = row[0]
+            else:
+                file_id = self.db.execute('INSERT INTO files (path, size, mtime_ns, crc_state, status) VALUES (?, ?, ?, ?, ?)',
+                                          (str(path), size, mtime_ns, crc_state, status)).lastrowid
+            self.db.executemany('INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?)',
+                                [(record_key, file_id, versions, removals, json.dumps(offsets), live)
+                                 for record_key, (versions, removals, offsets, live) in postings.items()])
+
+    def remove_file(self, path: Union[str, Path]):
+        """
+        Drops `path` and its postings from the index.
+        """
+        with self.db:
+            self.db.execute('DELETE FROM files WHERE path = ?', (str(self._absolute(path)),))
+
+    def update_directory(self, directory: Union[str, Path],
+                         keys: Optional[Dict[str, Union[str, bytes]]] = None, pattern: str = '*') -> Dict[str, int]:
+        """
+        Brings the index up to date with every MMKV file under `directory` (recursively) matching
+        `pattern`, dropping such files that no longer exist. `.crc` files are used as metadata, never indexed on their own, and
+        files failing `is_mmkv_file()` are counted as "skipped".
+
+        :param directory: extraction directory
+        :param keys: optional AES keys by file name (eg. {"mmkv.default": "0011..."})
+        :param pattern: optional glob restricting the candidate files (eg. "mmkv.*")
+        :return: a count of files per `update_file()` result, plus "skipped" and "removed"
+        """
+        directory = self._absolute(directory)
+        keys = keys or {}
+        summary: Dict[str, int] = {}
+        seen = set()
+        for path in sorted(directory.rglob(pattern)):
+            if path.is_dir() or path.suffix == '.crc':
+                continue
+            try:
+                if not self.is_mmkv_file(path):
+                    summary['skipped'] = summary.get('skipped', 0) + 1
+                    continue
+            except OSError:
+                # Recorded as "unreadable" by `update_file()`
+                pass
+            seen.add(str(path))
+            status = self.update_file(path, keys.get(path.name))
+            summary[status] = summary.get(status, 0) + 1
+
+        prefix = os.path.join(str(directory), '')
+        removed = [row[0] for row in self.db.execute('SELECT path FROM files')
+                   if row[0].startswith(prefix) and row[0] not in seen and Path(row[0]).match(pattern)]
+        for path in removed:
+            self.remove_file(path)
+        summary['removed'] = len(removed)
+        return summary
+
+    def lookup(self, key: str) -> List[dict]:
+        """
+        Returns every file that ever held `key`, with its versions, removals, record offsets and
+        whether it is still live there.
+
+        :param key: MMKV key
+        :return: list of dicts, one per file
+        """
+        rows = self.db.execute('SELECT files.path, versions, removals, offsets, live FROM postings '
+                               'JOIN files ON files.id = postings.file_id WHERE key = ? ORDER BY files.path', (key,))
+        return [{'file': path, 'versions': versions, 'removals': removals,
+                 'offsets': json.loads(offsets), 'live': bool(live)}
+                for path, versions, removals, offsets, live in rows]
+
+    def files(self) -> List[dict]:
+        """
+        Returns every indexed file with its status.
+        """
+        return [{'file': path, 'status': status}
+                for path, status in self.db.execute('SELECT path, status FROM files ORDER BY path')]
+
+    def close(self):
+        self.db.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description='Persistent key index across many MMKV stores.')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--index', default='mmkv_index.sqlite', help='SQLite index file')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', parents=[common],
+                                help='create or incrementally update the index for a directory')
+    build.add_argument('directory')
+    build.add_argument('--key', action='append', default=[], metavar='NAME=HEXKEY',
+                       help='AES key for an encrypted store, by file name')
+    build.add_argument('--pattern', default='*', help='glob restricting which files are considered')
+    lookup = commands.add_parser('lookup', parents=[common], help='list the stores that ever held a key')
+    lookup.add_argument('key')
+    args = arg_parser.parse_args(argv)
+
+    index = MMKVKeyIndex(args.index)
+    try:
+        if args.command == 'build':
+            keys = dict(entry.split('=', 1) for entry in args.key)
+            print(json.dumps(index.update_directory(args.directory, keys, args.pattern), indent=2))
+        else:
+            print(json.dumps(index.lookup(args.key), indent=2))
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
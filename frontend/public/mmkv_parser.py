@@ -1,12 +1,11 @@
 from io import BufferedIOBase, BytesIO
-from pathlib import Path
-from typing import Optional, List, Union, Tuple, DefaultDict
+from typing import Optional, List, Union, Tuple, DefaultDict, Dict, Callable, Iterator, AsyncIterator, Any
 from collections import defaultdict
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from bisect import bisect_right
 
-import sys
+import time
+import zlib
 import struct
-import ctypes
 
 """
 Global helper functions used for decoding 8-bit varints used within Google protocol buffers.
@@ -46,11 +45,8 @@ def decode_unsigned_varint(buffered_base: BufferedIOBase, mask: int = 32) -> Tup
         result |= (i & 0x7f) << shift
         shift += 7
         if not (i & 0x80):
-            if mask == 64:
-                # Result is casted via a "uint"
-                result = ctypes.c_uint64(result).value
-            else:
-                result = ctypes.c_uint32(result).value
+            # Result is truncated to the "uint" width of `mask`
+            result &= (1 << mask) - 1
             break
 
         byte = buffered_base.read(1)
@@ -94,11 +90,10 @@ def decode_signed_varint(buffered_base: BufferedIOBase, mask: int = 32) -> Tuple
         result |= (i & 0x7f) << shift
         shift += 7
         if not (i & 0x80):
-            if mask == 64:
-                # Result is casted via a "uint"
-                result = ctypes.c_int64(result).value
-            else:
-                result = ctypes.c_int32(result).value
+            # Result is truncated to the "int" width of `mask` and read as two's complement
+            result &= (1 << mask) - 1
+            if result & (1 << (mask - 1)):
+                result -= 1 << mask
             break
 
         byte = buffered_base.read(1)
@@ -111,6 +106,378 @@ def decode_signed_varint(buffered_base: BufferedIOBase, mask: int = 32) -> Tuple
     return result, bytes_read
 
 
+def decode_unsigned_varint_from_bytes(buffer: Union[bytes, bytearray, memoryview], pos: int = 0,
+                                      mask: int = 32) -> Tuple[int, int]:
+    """
+    Same as `decode_unsigned_varint`, but reads the varint at `buffer[pos:]` directly instead of
+    byte-by-byte from a stream. Used when parsing large in-memory chunks.
+
+    :param buffer: bytes-like object holding the varint
+    :param pos: index of the first varint byte
+    :param mask: an int that denotes either a 32 or 64-bit type.
+    :return: A Tuple[int, int] of (varint_result, bytes_read) or (-1, -1) if `buffer` ends mid-varint
+    """
+    shift = 0
+    result = 0
+    start = pos
+    while pos < len(buffer):
+        i = buffer[pos]
+        pos += 1
+
+        # Prepare the result by ANDing the lower 7-bits and shifting for every byte read
+        result |= (i & 0x7f) << shift
+        shift += 7
+        if not (i & 0x80):
+            return result & ((1 << mask) - 1), pos - start
+
+    return -1, -1
+
+
+def encode_unsigned_varint(value: int) -> bytes:
+    """
+    Encodes a non-negative int as a base-128 varint - the inverse of `decode_unsigned_varint`.
+
+    :param value: int to encode
+    :return: the varint bytes
+    """
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _aes_cfb_decryptor(key: Union[str, bytes], iv: bytes) -> Any:
+    """
+    Builds an incremental AES-128-CFB decryptor as MMKV uses for encrypted files.
+    Will pad `key` with NULL bytes or only take the first 16-bytes.
+
+    :param key: 16-byte AES key, or hexstring AES key
+    :param iv: 16-byte IV from the `.crc` file
+    :return: a `cryptography` decryptor context with `update()`/`finalize()`
+    """
+    # Imported here so unencrypted files never pay for loading `cryptography`
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    if isinstance(key, str):
+        key = bytes.fromhex(key)
+
+    # Validate the key size
+    if len(key) > 16:
+        key = key[:16]
+    elif len(key) < 16:
+        diff = (16 - len(key)) * b'\x00'
+        key += diff
+
+    return Cipher(algorithms.AES(key), modes.CFB(iv)).decryptor()
+
+
+class MMKVMetaInfo:
+    """
+    MMKVMetaInfo models the metadata MMKV keeps in the accompanying `.crc` file.
+    Layout (all little-endian uint32 unless noted):
+        [0:4]     CRC32 digest of the data region [4:4 + actual_size] of the MMKV file
+        [4:8]     meta version (>= 3 means `actual_size` is populated)
+        [8:12]    sequence, bumped every time MMKV does a full write-back
+        [12:28]   16-byte AES IV (all null bytes if the file isn't encrypted)
+        [28:32]   actual size of the data region
+        [32:36]   last confirmed actual size
+        [36:40]   last confirmed CRC32 digest
+        [40:104]  reserved
+        [104:112] flags (uint64)
+    Only the first 28 bytes are required; anything after is read if present.
+    """
+
+    REQUIRED_SIZE = 28
+    FULL_SIZE = 112
+    VERSION_ACTUAL_SIZE = 3
+
+    def __init__(self, crc_digest: int, version: int, sequence: int, iv: bytes,
+                 actual_size: int = 0, last_actual_size: int = 0, last_crc_digest: int = 0,
+                 flags: int = 0):
+        self.crc_digest = crc_digest
+        self.version = version
+        self.sequence = sequence
+        self.iv = iv
+        self.actual_size = actual_size
+        self.last_actual_size = last_actual_size
+        self.last_crc_digest = last_crc_digest
+        self.flags = flags
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'MMKVMetaInfo':
+        """
+        Parses the raw bytes of a `.crc` file into an `MMKVMetaInfo`.
+
+        :param data: at least the first 28 bytes of a `.crc` file
+        :return: the parsed `MMKVMetaInfo`
+        """
+        if len(data) < cls.REQUIRED_SIZE:
+            raise ValueError(f'[+] Error while reading crc_file. Header bytes was not {cls.REQUIRED_SIZE} bytes.')
+
+        crc_digest, version, sequence = struct.unpack('<III', data[0:12])
+        iv = data[12:28]
+        actual_size = last_actual_size = last_crc_digest = flags = 0
+        if len(data) >= 32:
+            actual_size = struct.unpack('<I', data[28:32])[0]
+        if len(data) >= 40:
+            last_actual_size, last_crc_digest = struct.unpack('<II', data[32:40])
+        if len(data) >= 112:
+            flags = struct.unpack('<Q', data[104:112])[0]
+
+        return cls(crc_digest, version, sequence, iv, actual_size, last_actual_size, last_crc_digest, flags)
+
+    def has_actual_size(self) -> bool:
+        """
+        Returns whether `actual_size` can be trusted as the bound of the data region.
+        """
+        return self.version >= self.VERSION_ACTUAL_SIZE and self.actual_size > 0
+
+    def is_encrypted(self) -> bool:
+        """
+        Returns whether the IV is populated, which MMKV only does for encrypted files.
+        """
+        return any(self.iv)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes back into the `.crc` layout described above (`FULL_SIZE` bytes).
+        """
+        return (struct.pack('<III', self.crc_digest, self.version, self.sequence) + self.iv.ljust(16, b'\x00')[:16]
+                + struct.pack('<III', self.actual_size, self.last_actual_size, self.last_crc_digest)
+                + b'\x00' * 64 + struct.pack('<Q', self.flags))
+
+    def to_dict(self) -> dict:
+        return {
+            'crc_digest': self.crc_digest,
+            'version': self.version,
+            'sequence': self.sequence,
+            'iv': self.iv.hex(),
+            'actual_size': self.actual_size,
+            'last_actual_size': self.last_actual_size,
+            'last_crc_digest': self.last_crc_digest,
+            'flags': self.flags,
+        }
+
+
+def _clock() -> Tuple[float, float]:
+    """
+    Returns a (wall, cpu) timestamp pair used by `MMKVParseStats` phase timers.
+    """
+    return time.perf_counter(), time.process_time()
+
+
+class MMKVParseStats:
+    """
+    MMKVParseStats is an opt-in collection of timers and counters for an `MMKVParser`, enabled
+    via `MMKVParser.enable_stats()`. Phases ("crc", "decrypt", "varint", "key_decode", "map_build")
+    accumulate wall and CPU seconds. An optional `callback(stats)` fires every `callback_interval`
+    records as a profiling hook. The stats are reset at the start of every top-level pass
+    (`decrypt_and_reconstruct()`, `decode_into_map()`, `decode_latest()`, `analyze_churn()`, `state_at()`),
+    so they always describe the most recent one. A decryption and the pass right after it count as one,
+    so the "crc" and "decrypt" timings can be compared with the parse that follows.
+    """
+
+    def __init__(self, callback: Optional[Callable[['MMKVParseStats'], None]] = None,
+                 callback_interval: int = 1000):
+        self.callback = callback
+        self.callback_interval = callback_interval
+        self.reset()
+
+    def reset(self, keep_phases: Tuple[str, ...] = ()):
+        """
+        Zeroes every timer and counter.
+
+        :param keep_phases: phases whose timers survive the reset
+        """
+        wall_times = getattr(self, 'wall_times', {})
+        cpu_times = getattr(self, 'cpu_times', {})
+        self.wall_times: DefaultDict[str, float] = defaultdict(float)
+        self.cpu_times: DefaultDict[str, float] = defaultdict(float)
+        for phase in keep_phases:
+            if phase in wall_times:
+                self.wall_times[phase] = wall_times[phase]
+                self.cpu_times[phase] = cpu_times[phase]
+        self.bytes_parsed = 0
+        self.key_bytes = 0
+        self.value_bytes = 0
+        self.records = 0
+        self.tombstones = 0
+        self.zero_length_keys = 0
+        self.errors = 0
+        self.peak_map_size = 0
+        self.stop_reason: Optional[str] = None
+
+    def lap(self, phase: str, start: Tuple[float, float]) -> Tuple[float, float]:
+        """
+        Adds the time elapsed since `start` to `phase` and returns the new timestamp,
+        so consecutive phases can be chained.
+
+        :param phase: name of the phase to charge
+        :param start: (wall, cpu) timestamp from `_clock()` or a previous `lap()`
+        :return: the current (wall, cpu) timestamp
+        """
+        now = _clock()
+        self.wall_times[phase] += now[0] - start[0]
+        self.cpu_times[phase] += now[1] - start[1]
+        return now
+
+    def record_parsed(self):
+        """
+        Counts a key-value record or tombstone and fires the callback every `callback_interval` records.
+        """
+        parsed = self.records + self.tombstones
+        if self.callback and self.callback_interval > 0 and parsed % self.callback_interval == 0:
+            self.callback(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'wall_times': dict(self.wall_times),
+            'cpu_times': dict(self.cpu_times),
+            'bytes_parsed': self.bytes_parsed,
+            'key_bytes': self.key_bytes,
+            'value_bytes': self.value_bytes,
+            'records': self.records,
+            'tombstones': self.tombstones,
+            'zero_length_keys': self.zero_length_keys,
+            'errors': self.errors,
+            'peak_map_size': self.peak_map_size,
+            'stop_reason': self.stop_reason,
+        }
+
+
+class MMKVKeyChurn:
+    """
+    MMKVKeyChurn holds the running write/remove aggregates of a single key, as collected by
+    `MMKVParser.analyze_churn()`. Memory is constant per key - no values are retained.
+    """
+
+    __slots__ = ('key', 'versions', 'removals', 'value_bytes', 'record_bytes', 'live_bytes',
+                 'last_offset', 'last_ordinal', 'rewrites', 'rewrite_bytes_total', 'rewrite_records_total',
+                 'min_rewrite_bytes', 'max_rewrite_bytes')
+
+    def __init__(self, key: str):
+        self.key = key
+        self.versions = 0
+        self.removals = 0
+        self.value_bytes = 0
+        self.record_bytes = 0
+
+        # Size of the record currently holding the live value, 0 if removed
+        self.live_bytes = 0
+
+        # Offset and ordinal of the previous record for this key, used for rewrite distances
+        self.last_offset: Optional[int] = None
+        self.last_ordinal: Optional[int] = None
+        self.rewrites = 0
+        self.rewrite_bytes_total = 0
+        self.rewrite_records_total = 0
+        self.min_rewrite_bytes: Optional[int] = None
+        self.max_rewrite_bytes: Optional[int] = None
+
+    def add(self, ordinal: int, offset: int, record_size: int, value_bytes: Optional[bytes]):
+        """
+        Folds one record (a write, or a removal when `value_bytes` is None) into the aggregates.
+        """
+        if self.last_offset is not None:
+            distance = offset - self.last_offset
+            self.rewrites += 1
+            self.rewrite_bytes_total += distance
+            self.rewrite_records_total += ordinal - self.last_ordinal
+            self.min_rewrite_bytes = distance if self.min_rewrite_bytes is None else min(self.min_rewrite_bytes, distance)
+            self.max_rewrite_bytes = distance if self.max_rewrite_bytes is None else max(self.max_rewrite_bytes, distance)
+        self.last_offset = offset
+        self.last_ordinal = ordinal
+        self.record_bytes += record_size
+
+        if value_bytes is None:
+            self.removals += 1
+            self.live_bytes = 0
+        else:
+            self.versions += 1
+            self.value_bytes += len(value_bytes)
+            self.live_bytes = record_size
+
+    @property
+    def avg_value_size(self) -> float:
+        return self.value_bytes / self.versions if self.versions else 0.0
+
+    @property
+    def avg_rewrite_distance_bytes(self) -> Optional[float]:
+        return self.rewrite_bytes_total / self.rewrites if self.rewrites else None
+
+    @property
+    def avg_rewrite_distance_records(self) -> Optional[float]:
+        return self.rewrite_records_total / self.rewrites if self.rewrites else None
+
+    def to_dict(self) -> dict:
+        return {
+            'key': self.key,
+            'versions': self.versions,
+            'removals': self.removals,
+            'value_bytes': self.value_bytes,
+            'avg_value_size': self.avg_value_size,
+            'record_bytes': self.record_bytes,
+            'live_bytes': self.live_bytes,
+            'dead_bytes': self.record_bytes - self.live_bytes,
+            'avg_rewrite_distance_bytes': self.avg_rewrite_distance_bytes,
+            'avg_rewrite_distance_records': self.avg_rewrite_distance_records,
+            'min_rewrite_distance_bytes': self.min_rewrite_bytes,
+            'max_rewrite_distance_bytes': self.max_rewrite_bytes,
+        }
+
+
+class MMKVChurnReport:
+    """
+    MMKVChurnReport is the result of `MMKVParser.analyze_churn()`: per-key `MMKVKeyChurn` aggregates
+    plus file-wide live vs. dead byte totals. "Live" bytes are the records MMKV would still
+    return (the newest write of a key that wasn't removed), everything else is dead weight.
+    """
+
+    def __init__(self):
+        self.keys: dict = {}
+        self.records = 0
+        self.total_bytes = 0
+
+    @property
+    def live_bytes(self) -> int:
+        return sum(churn.live_bytes for churn in self.keys.values())
+
+    @property
+    def dead_bytes(self) -> int:
+        return self.total_bytes - self.live_bytes
+
+    @property
+    def live_ratio(self) -> float:
+        return self.live_bytes / self.total_bytes if self.total_bytes else 0.0
+
+    def top_keys(self, n: int = 10, by: str = 'dead_bytes') -> List[MMKVKeyChurn]:
+        """
+        Returns the `n` keys contributing most to file growth.
+
+        :param n: number of keys to return
+        :param by: a `MMKVKeyChurn.to_dict()` field to rank by, "dead_bytes" by default
+        :return: list of `MMKVKeyChurn`, largest first
+        """
+        return sorted(self.keys.values(), key=lambda churn: churn.to_dict()[by] or 0, reverse=True)[:n]
+
+    def to_dict(self) -> dict:
+        live_bytes = self.live_bytes
+        return {
+            'records': self.records,
+            'distinct_keys': len(self.keys),
+            'total_bytes': self.total_bytes,
+            'live_bytes': live_bytes,
+            'dead_bytes': self.total_bytes - live_bytes,
+            'live_ratio': live_bytes / self.total_bytes if self.total_bytes else 0.0,
+            'keys': {key: churn.to_dict() for key, churn in self.keys.items()},
+        }
+
+
 class MMKVParser:
     """
     MMKVParser is a class that will read in an MMKV file and optionally a CRC32 file and will
@@ -121,6 +488,12 @@ class MMKVParser:
     user to decode arbitrary bytes into a protobuf type.
     """
 
+    # Chunk size used when streaming over the data region for the CRC32 check
+    CRC_CHUNK_SIZE = 64 * 1024
+
+    # Files written by `write_compacted()` are padded to a multiple of this, like MMKV's mmap'd files
+    COMPACT_PAGE_SIZE = 4096
+
     def __init__(self, mmkv_file_data: Union[str, BufferedIOBase],
                  crc_file_data: Union[str, BufferedIOBase, None] = None):
         """
@@ -131,61 +504,154 @@ class MMKVParser:
         :param mmkv_file_data: A hexstring of mmkv data from Pyodide-based viewer, or native Python BufferedIOBase
         :param crc_file_data: Same as mmkv_file_data, but defaults to None because the CRC check will be optional
         """
+        self.decoded_map: DefaultDict[str, List[bytes]] = defaultdict(list)
+        self.latest_map: Dict[str, bytes] = {}
 
-        # Handle cases with `mmkv_file_data`:
-        # 1. mmkv_file_data is str
-        if isinstance(mmkv_file_data, str):
+        # (key, index) -> (value bytes, lazy nested decoder) - see `decode_nested()`
+        self._nested_cache: Dict[Tuple[str, int], Tuple[bytes, Any]] = {}
 
-            # Check that it's a valid hexstring
-            int(mmkv_file_data, 16)
+        # (sequence, crc_digest) of the .crc metadata the current `decoded_map` was built from
+        self._parsed_meta_state: Optional[Tuple[int, int]] = None
 
-            # Convert hexstring into a BufferedIOBase 
-            mmkv_file_data = BytesIO(bytes.fromhex(mmkv_file_data))
+        # Opt-in instrumentation - see `enable_stats()`
+        self.stats: Optional[MMKVParseStats] = None
 
-        # 2. mmkv_file_data is BufferedIOBase
-        elif isinstance(mmkv_file_data, BufferedIOBase):
-            pass
+        # Set by `decrypt_and_reconstruct()` so the next pass keeps its timings
+        self._stats_after_decrypt: bool = False
 
-        # 3. mmkv_file_data is neither
-        else:
-            raise TypeError(f'mmkv_file_data is of type {type(mmkv_file_data)} - should be either hex str or bytes.')
+        # Point-in-time checkpoints of the live state - see `enable_checkpoints()` and `state_at()`.
+        # Each checkpoint is (records applied, stream position of the next record, live state)
+        self.checkpoints_enabled: bool = False
+        self.checkpoint_interval: int = 1000
+        self._checkpoints: Optional[List[Tuple[int, Optional[int], Dict[str, bytes]]]] = None
+        self._checkpoints_meta_state: Optional[Tuple[int, int]] = None
+        self.record_count: Optional[int] = None
+
+        self._load(mmkv_file_data, crc_file_data)
 
-        # Handle cases with `crc_file_data`:
-        # 1. crc_file_data is str
-        if isinstance(crc_file_data, str):
+    @staticmethod
+    def _to_stream(file_data: Union[str, BufferedIOBase, None], name: str) -> Optional[BufferedIOBase]:
+        """
+        Coerces a hexstring (Pyodide-based API) or `BufferedIOBase` into a stream.
+
+        :param file_data: hexstring, `BufferedIOBase` or None
+        :param name: parameter name used in error messages
+        :return: a `BufferedIOBase`, or None if `file_data` was None
+        """
+        # 1. file_data is str
+        if isinstance(file_data, str):
 
             # Check that it's a valid hexstring
-            int(crc_file_data, 16)
+            int(file_data, 16)
 
             # Convert hexstring into a BufferedIOBase 
-            crc_file_data = BytesIO(bytes.fromhex(crc_file_data))
+            return BytesIO(bytes.fromhex(file_data))
 
-        # 2. crc_file_data is BufferedIOBase
-        elif isinstance(crc_file_data, BufferedIOBase):
-            pass
+        # 2. file_data is BufferedIOBase or None
+        elif isinstance(file_data, BufferedIOBase) or file_data is None:
+            return file_data
 
-        # 3. crc_file_data is None
+        # 3. file_data is neither
         else:
-            pass
+            raise TypeError(f'{name} is of type {type(file_data)} - should be either hex str or bytes.')
+
+    def _load(self, mmkv_file_data: Union[str, BufferedIOBase],
+              crc_file_data: Union[str, BufferedIOBase, None]):
+        """
+        Attaches the mmkv and optional crc streams and parses the `.crc` metadata.
+        """
+        if mmkv_file_data is None:
+            raise TypeError(f'mmkv_file_data is of type {type(mmkv_file_data)} - should be either hex str or bytes.')
 
         # Initialize our files
-        self.mmkv_file: BufferedIOBase = mmkv_file_data
-        self.crc_file: Optional[BufferedIOBase] = crc_file_data
+        self.mmkv_file: BufferedIOBase = self._to_stream(mmkv_file_data, 'mmkv_file_data')
+        self.crc_file: Optional[BufferedIOBase] = self._to_stream(crc_file_data, 'crc_file_data')
         self.pos: int = 0
-        self.decoded_map: DefaultDict[str, List[bytes]] = defaultdict(list)
+        self.meta: Optional[MMKVMetaInfo] = None
+
+        # Result of the CRC32 check against `self.meta` - None until checked
+        self.crc_valid: Optional[bool] = None
 
-        # Found IV from .crc file - don't read anything from the stream if encrypted
+        # The original encrypted stream, kept once decrypted so another key can be tried
+        self._encrypted_file: Optional[BufferedIOBase] = None
+
+        # Found metadata (and IV) from .crc file - don't read anything from the mmkv stream if encrypted
         if self.crc_file:
-            crc_header_bytes = self.crc_file.read(28)
-            if len(crc_header_bytes) != 28:
-                raise ValueError('[+] Error while reading crc_file. Header bytes was not 28 bytes.')
-            self.iv = crc_header_bytes[12:28]
+            self.meta = MMKVMetaInfo.from_bytes(self.crc_file.read(MMKVMetaInfo.FULL_SIZE))
+            self.iv = self.meta.iv
 
         # Cannot find IV from .crc file - prepare stream for decoding into a map
         else:
             print('[+] .CRC file was not passed in - is needed for decryption routines')
             self.iv = b''
 
+        # Checkpoints only survive a reload if the .crc metadata says the file is unchanged
+        meta_state = (self.meta.sequence, self.meta.crc_digest) if self.meta else None
+        if meta_state is None or meta_state != self._checkpoints_meta_state:
+            self._checkpoints = None
+            self.record_count = None
+
+        # Same for the nested decodes, which belong to the `decoded_map` the next parse reuses
+        if meta_state is None or meta_state != self._parsed_meta_state:
+            self._nested_cache = {}
+
+    def _begin_stats_pass(self):
+        """
+        Resets `self.stats` (if enabled) so it only describes the pass that is starting.
+        The timings of a decryption right before the pass are kept.
+        """
+        keep_phases = ('crc', 'decrypt') if self._stats_after_decrypt else ()
+        self._stats_after_decrypt = False
+        if self.stats:
+            self.stats.reset(keep_phases)
+
+    def _replace_mmkv_file(self, mmkv_file: BufferedIOBase):
+        """
+        Swaps in new `mmkv_file` contents (eg. the decrypted file). Anything derived from the old
+        contents - the "unchanged" parse state and the checkpoints - no longer applies.
+        """
+        self.mmkv_file = mmkv_file
+        self.pos = 0
+        self._parsed_meta_state = None
+        self._nested_cache = {}
+        self._checkpoints = None
+        self._checkpoints_meta_state = None
+        self.record_count = None
+
+    def reload(self, mmkv_file_data: Union[str, BufferedIOBase],
+               crc_file_data: Union[str, BufferedIOBase, None] = None):
+        """
+        Points this parser at a fresh copy of the (possibly updated) MMKV file and `.crc` file.
+        If the `.crc` sequence and CRC digest match the last parse, the next `decode_into_map()`
+        returns the already built map without re-parsing.
+
+        :param mmkv_file_data: A hexstring of mmkv data from Pyodide-based viewer, or native Python BufferedIOBase
+        :param crc_file_data: Same as mmkv_file_data, but defaults to None
+        """
+        self._load(mmkv_file_data, crc_file_data)
+
+    def enable_stats(self, callback: Optional[Callable[[MMKVParseStats], None]] = None,
+                     callback_interval: int = 1000) -> MMKVParseStats:
+        """
+        Turns on per-phase timers and parse counters, readable via `self.stats.to_dict()`.
+
+        :param callback: optional hook called with the stats every `callback_interval` records
+        :param callback_interval: number of records between `callback` calls
+        :return: the `MMKVParseStats` instance, which is also an instance variable
+        """
+        self.stats = MMKVParseStats(callback, callback_interval)
+        return self.stats
+
+    def enable_checkpoints(self, interval: int = 1000):
+        """
+        Makes `decode_into_map()` snapshot the live key-value state every `interval` records,
+        so `state_at()` only has to replay at most `interval` records per query.
+
+        :param interval: number of records between checkpoints
+        """
+        self.checkpoints_enabled = True
+        self.checkpoint_interval = interval
+
     def _get_db_size(self) -> int:
         """
         Returns the actual size known to the MMKV API for querying data. This includes older
@@ -204,7 +670,28 @@ class MMKVParser:
         else:
             raise TypeError(f'[+] Error while unpacking header bytes. Received {type(size)}')
 
+    def _get_data_end(self) -> int:
+        """
+        Returns the absolute offset in `mmkv_file` at which the data region ends. The `.crc`
+        actual size is authoritative when present, then the header size, then a 4GB best-effort bound.
+
+        :return: int end offset
+        """
+        if self.meta and self.meta.has_actual_size():
+            return 4 + self.meta.actual_size
+
+        db_size = self._get_db_size()
+        if db_size == 0:
+            print('[+] DB Size is 0! Best-effort approach as a 4GB file')
+            db_size = 2 ** 32
+        return 4 + db_size
+
     def _prepare_mmkv_stream_for_decoding(self):
+        # Rewind so the stream can be walked more than once (eg. decode_into_map() then analyze_churn())
+        if self.mmkv_file.seekable():
+            self.mmkv_file.seek(0)
+        self.pos = 0
+
         # Read in first 4 header bytes - [0:4] is total size
         self.header_bytes: bytes = self.mmkv_file.read(4)
         if len(self.header_bytes) != 4:
@@ -219,6 +706,43 @@ class MMKVParser:
 
         self.pos += bytes_read
 
+    def verify_crc(self) -> Optional[bool]:
+        """
+        Streams the data region [4:4 + actual_size] of `mmkv_file` through `zlib.crc32` and
+        compares it to the `.crc` digest. The stream position is restored afterwards.
+        Must be called before `decrypt_and_reconstruct()`, as MMKV digests the encrypted bytes.
+
+        :return: True/False for a match/mismatch, or None if there is no usable `.crc` metadata
+                 or the stream isn't seekable
+        """
+        if not (self.meta and self.meta.has_actual_size()):
+            return None
+
+        # The stream has to be rewound afterwards, which a non-seekable stream can't do
+        if not self.mmkv_file.seekable():
+            print('[+] verify_crc() - mmkv_file is not seekable, skipping the CRC check')
+            return None
+
+        clock = _clock()
+        start = self.mmkv_file.tell()
+        self.mmkv_file.seek(4)
+        remaining = self.meta.actual_size
+        crc = 0
+        while remaining > 0:
+            chunk = self.mmkv_file.read(min(self.CRC_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            remaining -= len(chunk)
+        self.mmkv_file.seek(start)
+        if self.stats:
+            self.stats.lap('crc', clock)
+
+        self.crc_valid = remaining == 0 and crc == self.meta.crc_digest
+        if not self.crc_valid:
+            print(f'[+] verify_crc() - CRC32 mismatch, expected {self.meta.crc_digest:#010x} got {crc:#010x}')
+        return self.crc_valid
+
     def decrypt_and_reconstruct(self, key: Union[str, bytes]) -> bytes:
         """
         Attempts to decrypt `self.mmkv_file` data with `key` and `self.iv` using
@@ -229,67 +753,85 @@ class MMKVParser:
         :return: decrypted mmkv file in bytes
         """
         print(f'iv: {self.iv}')
-        if isinstance(key, str):
-            key = bytes.fromhex(key)
-
-        # Validate the key size
-        if len(key) > 16:
-            key = key[:16]
-        elif len(key) < 16:
-            diff = (16 - len(key)) * b'\x00'
-            key += diff
-
-        size = self.mmkv_file.read(4)
+        decryptor = _aes_cfb_decryptor(key, self.iv)
+
+        # Always decrypt the original bytes, even if a previous (wrong) key already replaced `mmkv_file`
+        self._begin_stats_pass()
+        clock = _clock()
+        encrypted_file = self._encrypted_file or self.mmkv_file
+        if encrypted_file.seekable():
+            encrypted_file.seek(0)
+        size = encrypted_file.read(4)
         print(f'size: {size}')
-        encrypted_data = self.mmkv_file.read()
+        encrypted_data = encrypted_file.read()
+        self._encrypted_file = encrypted_file
+
+        # The digest covers the encrypted bytes, so check it while we still have them
+        if self.meta and self.meta.has_actual_size():
+            if self.stats:
+                clock = self.stats.lap('decrypt', clock)
+            self.crc_valid = zlib.crc32(encrypted_data[:self.meta.actual_size]) == self.meta.crc_digest
+            if self.stats:
+                clock = self.stats.lap('crc', clock)
 
-        cipher = Cipher(algorithms.AES(key), modes.CFB(self.iv))
-        decryptor = cipher.decryptor()
         res = decryptor.update(encrypted_data) + decryptor.finalize()
         res = size + res
 
-        self.mmkv_file = BytesIO(res)
+        self._replace_mmkv_file(BytesIO(res))
+        if self.stats:
+            self.stats.lap('decrypt', clock)
+        self._stats_after_decrypt = True
         return res
 
     '''
         Decoding Procedures
     '''
 
-    def decode_into_map(self) -> DefaultDict[str, List[bytes]]:
+    def iter_records(self, start: Optional[int] = None) -> Iterator[Tuple[int, str, Optional[bytes]]]:
         """
-        A best-effort approach on linearly parsing the `mmkv_file` stream and building up 
-        dictionary of keys mapped to a list of bytes values, with the most recent value being at the lowest index.
+        A best-effort approach on linearly parsing the `mmkv_file` stream, yielding every record
+        in log order as (offset, key, value_bytes). Removed key-value pairs yield a value of None.
+        Parsing stops at the end of the data region or on the first undecodable record.
 
-        :return: a built up defaultdict, which is also an instance variable
+        :param start: optional absolute offset of a record boundary to resume parsing from
+        :return: an iterator of (absolute record offset, key, value bytes or None)
         """
+        stats = self.stats
 
         # Prepare first
         self._prepare_mmkv_stream_for_decoding()
+        if start is not None:
+            self.mmkv_file.seek(start)
+            self.pos = start
 
-        # Get size of database
-        db_size = self._get_db_size()
+        # Get the end of the data region
+        data_end = self._get_data_end()
+        stop_reason = 'end_of_data'
 
-        # Check db_size - max out if needed
-        if db_size == 0:
-            print('[+] DB Size is 0! Best-effort approach as a 4GB file')
-            db_size = 2 ** 32
-
-        # Iterate through the database and build-up our dictionary
-        while self.pos < db_size:
+        # Iterate through the database
+        while self.pos < data_end:
+            offset = self.pos
+            if stats:
+                clock = _clock()
 
             # Parse the key length 
             key_length, bytes_read = decode_unsigned_varint(self.mmkv_file, mask=32)
 
             # Check if parsing key length failed
             if (key_length, bytes_read) == (-1, -1):
-                print('[+] decode_into_map() - cannot parse key length, breaking.')
+                print('[+] iter_records() - cannot parse key length, breaking.')
+                stop_reason = 'key_length_error'
                 break
             if key_length == 0:
-                print('[+] decode_into_map() - key length is 0, skipping and continuing')
+                print('[+] iter_records() - key length is 0, skipping and continuing')
                 self.pos += 1
+                if stats:
+                    stats.zero_length_keys += 1
                 continue
 
             self.pos += bytes_read
+            if stats:
+                clock = stats.lap('varint', clock)
 
             try:
                 # Read the key (always UTF-8 String)
@@ -298,36 +840,257 @@ class MMKVParser:
                 self.pos += key_length
 
             except UnicodeDecodeError:
-                print(f'[+] decode_into_map() - Error trying to decode {key_bytes!r}. breaking')
+                print(f'[+] iter_records() - Error trying to decode {key_bytes!r}. breaking')
+                stop_reason = 'key_decode_error'
                 break
 
+            if stats:
+                clock = stats.lap('key_decode', clock)
+                stats.key_bytes += key_length
+
             # Parse the value length
             value_length, bytes_read = decode_unsigned_varint(self.mmkv_file, mask=32)
-            self.pos += bytes_read
 
             # Check if parsing value length failed
             if (value_length, bytes_read) == (-1, -1):
-                print('[+] decode_into_map() - cannot parse value length, breaking.')
+                print('[+] iter_records() - cannot parse value length, breaking.')
+                stop_reason = 'value_length_error'
                 break
 
+            self.pos += bytes_read
+
             # IMPORTANT - a key-value pair that was removed via the MMKV API will have a 
             # valid key, but will be followed by a null byte, signifying that the key-value pair 
             # was removed.
             # eg. <key length> | <key> | \x00
             if value_length == 0:
-                print('[+] decode_into_map() - value length is 0, KV pair was removed. Continuing')
-                self.pos += bytes_read
+                print('[+] iter_records() - value length is 0, KV pair was removed. Continuing')
+                if stats:
+                    stats.lap('varint', clock)
+                    stats.tombstones += 1
+                    stats.bytes_parsed = self.pos
+                    stats.record_parsed()
+                yield offset, key, None
                 continue
 
             # Parse the value (bytes which will then be iterpretable, since there's type tied to data)
             value_bytes = self.mmkv_file.read(value_length)
             self.pos += value_length
 
+            if stats:
+                stats.lap('varint', clock)
+                stats.records += 1
+                stats.value_bytes += value_length
+                stats.bytes_parsed = self.pos
+                stats.record_parsed()
+            yield offset, key, value_bytes
+
+        if stats:
+            stats.bytes_parsed = self.pos
+            stats.stop_reason = stop_reason
+            if stop_reason != 'end_of_data':
+                stats.errors += 1
+
+    def _checkpointing(self, records: Iterator[Tuple[int, str, Optional[bytes]]]) -> Iterator[Tuple[int, str, Optional[bytes]]]:
+        """
+        Passes `records` through untouched while snapshotting the live state into `self._checkpoints`
+        every `self.checkpoint_interval` records.
+
+        :param records: the iterator returned by `iter_records()` from the start of the log
+        :return: the same records
+        """
+        live: Dict[str, bytes] = {}
+        checkpoints = [(0, None, {})]
+        count = 0
+        for offset, key, value_bytes in records:
+            yield offset, key, value_bytes
+
+            if value_bytes is None:
+                live.pop(key, None)
+            else:
+                live[key] = value_bytes
+            count += 1
+
+            # `self.pos` already sits at the start of the next record
+            if count % self.checkpoint_interval == 0:
+                checkpoints.append((count, self.pos, dict(live)))
+
+        self._checkpoints = checkpoints
+        self._checkpoints_meta_state = (self.meta.sequence, self.meta.crc_digest) if self.meta else None
+        self.record_count = count
+
+    def state_at(self, ordinal: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, bytes]:
+        """
+        Reconstructs the key-value state MMKV would have returned at a point in the log: after the
+        first `ordinal` records, or after every record starting before byte `offset`. Removed keys
+        are absent and each key maps to its newest value bytes. Replays from the nearest checkpoint,
+        building the checkpoints with a single pass first if needed. The replay seeks, so `mmkv_file`
+        must be seekable.
+
+        :param ordinal: number of records applied (0 is the empty store)
+        :param offset: absolute byte offset in the MMKV file
+        :return: a dict of key to value bytes
+        """
+        if (ordinal is None) == (offset is None):
+            raise ValueError('[+] state_at() - exactly one of ordinal or offset must be given.')
+        if not self.mmkv_file.seekable():
+            raise ValueError('[+] state_at() - mmkv_file is not seekable, cannot replay from a checkpoint.')
+        self._begin_stats_pass()
+
+        if self._checkpoints is None:
+            for _ in self._checkpointing(self.iter_records()):
+                pass
+
+        # Find the latest checkpoint at or before the requested point
+        if ordinal is not None:
+            index = bisect_right([count for count, _, _ in self._checkpoints], ordinal) - 1
+        else:
+            index = bisect_right([pos or 0 for _, pos, _ in self._checkpoints], offset) - 1
+        count, pos, state = self._checkpoints[max(index, 0)]
+        state = dict(state)
+
+        # Replay the remainder of the interval, without parsing past the requested ordinal
+        if ordinal is not None and count >= ordinal:
+            return state
+        for record_offset, key, value_bytes in self.iter_records(start=pos):
+            if offset is not None and record_offset >= offset:
+                break
+            if value_bytes is None:
+                state.pop(key, None)
+            else:
+                state[key] = value_bytes
+            count += 1
+            if ordinal is not None and count >= ordinal:
+                break
+
+        return state
+
+    def decode_into_map(self, verify_crc: bool = True) -> DefaultDict[str, List[bytes]]:
+        """
+        A best-effort approach on linearly parsing the `mmkv_file` stream and building up 
+        dictionary of keys mapped to a list of bytes values, with the most recent value being at the lowest index.
+        When `.crc` metadata is present its actual size bounds the parse, and if its sequence and digest
+        are unchanged since the last parse the existing map is returned as is.
+
+        :param verify_crc: whether to run the CRC32 integrity check against the `.crc` digest
+        :return: a built up defaultdict, which is also an instance variable
+        """
+        self._begin_stats_pass()
+        stats = self.stats
+
+        # Skip re-parsing if the .crc metadata hasn't changed since the last parse
+        meta_state = (self.meta.sequence, self.meta.crc_digest) if self.meta else None
+        if meta_state is not None and meta_state == self._parsed_meta_state:
+            print('[+] decode_into_map() - .crc sequence and digest unchanged, reusing last parse')
+            if stats:
+                stats.stop_reason = 'unchanged'
+            return self.decoded_map
+
+        # A mismatch is only reported - parsing stays best-effort
+        if verify_crc and self.crc_valid is None:
+            self.verify_crc()
+
+        self.decoded_map = defaultdict(list)
+        self._nested_cache = {}
+        records = self.iter_records()
+        if self.checkpoints_enabled:
+            records = self._checkpointing(records)
+
+        # Build-up our dictionary
+        for _, key, value_bytes in records:
+            if value_bytes is None:
+                continue
+
+            if stats:
+                clock = _clock()
+
             # Update our decoded_map
             self.decoded_map[key].insert(0, value_bytes)
 
+            if stats:
+                stats.lap('map_build', clock)
+                stats.peak_map_size = max(stats.peak_map_size, len(self.decoded_map))
+
+        self._parsed_meta_state = meta_state
         return self.decoded_map
 
+    def decode_latest(self) -> Dict[str, bytes]:
+        """
+        Parses the log keeping only what the MMKV API itself would return: the newest value per key,
+        with removed keys dropped. Memory scales with the live keys instead of the log length.
+        Does not touch `decoded_map`.
+
+        :return: a dict of key to newest value bytes, which is also an instance variable
+        """
+        self._begin_stats_pass()
+        self.latest_map: Dict[str, bytes] = {}
+        for _, key, value_bytes in self.iter_records():
+            if value_bytes is None:
+                self.latest_map.pop(key, None)
+            else:
+                self.latest_map[key] = value_bytes
+        return self.latest_map
+
+    def write_compacted(self, mmkv_output: BufferedIOBase, crc_output: Optional[BufferedIOBase] = None) -> int:
+        """
+        Writes the `decode_latest()` state as a fresh, unencrypted MMKV file - one record per live key -
+        and optionally a matching `.crc` file, both padded to `COMPACT_PAGE_SIZE`.
+        Encrypted inputs must be decrypted via `decrypt_and_reconstruct()` first.
+
+        :param mmkv_output: writable binary stream for the MMKV file
+        :param crc_output: optional writable binary stream for the `.crc` file
+        :return: the actual size of the written data region
+        """
+        # Otherwise the records would be ciphertext, written out as a valid-looking plaintext file
+        if self.meta and self.meta.is_encrypted() and self._encrypted_file is None:
+            raise ValueError('[+] write_compacted() - mmkv_file is encrypted, call decrypt_and_reconstruct() first.')
+        latest_map = self.decode_latest()
+
+        # [4:X] item size holder MMKV writes ahead of a full write-back, then the records
+        data = bytearray(encode_unsigned_varint(0x00ffffff))
+        for key, value_bytes in latest_map.items():
+            key_bytes = key.encode('utf-8')
+            data += encode_unsigned_varint(len(key_bytes)) + key_bytes
+            data += encode_unsigned_varint(len(value_bytes)) + value_bytes
+
+        file_size = 4 + len(data)
+        padding = -file_size % self.COMPACT_PAGE_SIZE
+        mmkv_output.write(struct.pack('<I', len(data)) + bytes(data) + b'\x00' * padding)
+
+        if crc_output is not None:
+            meta = MMKVMetaInfo(crc_digest=zlib.crc32(data), version=MMKVMetaInfo.VERSION_ACTUAL_SIZE,
+                                sequence=self.meta.sequence + 1 if self.meta else 1, iv=b'\x00' * 16,
+                                actual_size=len(data), last_actual_size=len(data), last_crc_digest=zlib.crc32(data))
+            crc_output.write(meta.to_bytes().ljust(self.COMPACT_PAGE_SIZE, b'\x00'))
+
+        return len(data)
+
+    def analyze_churn(self) -> MMKVChurnReport:
+        """
+        Walks the whole log once and reports, per key, how many versions and removals it has,
+        the bytes spent on all of its historical values and how far apart its rewrites are,
+        along with file-wide live vs. dead byte totals. No values are retained, so memory is
+        bounded by the number of distinct keys. Does not touch `decoded_map`.
+
+        :return: an `MMKVChurnReport`
+        """
+        self._begin_stats_pass()
+        report = MMKVChurnReport()
+        for ordinal, (offset, key, value_bytes) in enumerate(self.iter_records()):
+
+            # `self.pos` already sits at the end of the record that was just yielded
+            record_size = self.pos - offset
+
+            churn = report.keys.get(key)
+            if churn is None:
+                churn = report.keys[key] = MMKVKeyChurn(key)
+            churn.add(ordinal, offset, record_size, value_bytes)
+
+            report.records += 1
+            report.total_bytes += record_size
+
+        return report
+
     @staticmethod
     def decode_as_int32(value: Union[str, bytes]) -> int:
         """
@@ -438,6 +1201,48 @@ class MMKVParser:
 
         return value
 
+    @staticmethod
+    def decode_as_nested(value: Union[str, bytes]) -> Union['LazyBinaryPlist', 'LazyProtobufMessage', None]:
+        """
+        Attempts to decode `value` as a nested blob, lazily: a binary plist (eg. NSKeyedArchiver) or
+        an embedded protobuf message. Only the top level is parsed here.
+        Note: the "erroneous" varint length wrapper is stripped when present
+
+        :param value: hexstring for Pyodide-based API or protobuf-encoded NSData/bytes value
+        :return: a `LazyBinaryPlist`, `LazyProtobufMessage`, or None if neither parses
+        """
+        if isinstance(value, str):
+            value = bytes.fromhex(value)
+
+        # Strip off the varint length delimiter bytes if they cover the rest of `value`
+        varint, varint_len = decode_unsigned_varint_from_bytes(value, 0, mask=32)
+        if varint_len != -1 and varint_len + varint == len(value):
+            value = value[varint_len:]
+
+        if value.startswith(LazyBinaryPlist.MAGIC):
+            try:
+                return LazyBinaryPlist(value)
+            except (ValueError, struct.error):
+                print(f'[+] Could not binary plist decode value')
+        return LazyProtobufMessage.try_parse(value)
+
+    def decode_nested(self, key: str, index: int = 0) -> Union['LazyBinaryPlist', 'LazyProtobufMessage', None]:
+        """
+        `decode_as_nested()` for the `index`-th most recent value of `key` in `decoded_map`, memoized per
+        value so the lazily decoded subtrees are kept between calls.
+
+        :param key: key in `decoded_map`
+        :param index: 0 is the most recent value
+        :return: a `LazyBinaryPlist`, `LazyProtobufMessage`, or None if neither parses (or no such value)
+        """
+        values = self.decoded_map.get(key, [])
+        if index >= len(values):
+            return None
+        value = values[index]
+        if (key, index) not in self._nested_cache or self._nested_cache[(key, index)][0] is not value:
+            self._nested_cache[(key, index)] = (value, self.decode_as_nested(value))
+        return self._nested_cache[(key, index)][1]
+
     @staticmethod
     def decode_as_float(value: Union[str, bytes]) -> Optional[float]:
         """
@@ -472,3 +1277,485 @@ class MMKVParser:
         else:
             print(f'[+] Could not bool decode {value!r}')
             return None
+
+
+def _parse_record_buffer(buffer: Union[bytes, bytearray], pos: int, base: int, end: int,
+                         final: bool) -> Tuple[List[Tuple[int, str, Optional[bytes]]], int, Optional[str], int]:
+    """
+    Parses every complete record in `buffer[pos:]`, the same way `MMKVParser.iter_records()` does for a
+    stream. A record cut off by the end of `buffer` is left unconsumed unless `final` is set.
+    `buffer` is only read through a memoryview - nothing but the keys and values is copied.
+
+    :param buffer: decrypted bytes of the data region
+    :param pos: index in `buffer` of the next record boundary
+    :param base: absolute offset of `buffer[0]` within the MMKV file
+    :param end: absolute offset the data region ends at
+    :param final: whether no more bytes will follow `buffer`
+    :return: (records as (offset, key, value bytes or None), index of the next unparsed record,
+              stop reason or None to keep going, buffer length needed to complete the cut off record)
+    """
+    records = []
+    with memoryview(buffer) as view:
+        size = len(view)
+        while base + pos < end:
+            if pos >= size:
+                return records, pos, 'end_of_data' if final else None, size + 1
+
+            # Parse the key length
+            key_length, bytes_read = decode_unsigned_varint_from_bytes(view, pos, mask=32)
+            if (key_length, bytes_read) == (-1, -1):
+                return records, pos, 'key_length_error' if final else None, size + 1
+            if key_length == 0:
+                pos += 1
+                continue
+
+            # Read the key (always UTF-8 String)
+            key_start = pos + bytes_read
+            key_end = key_start + key_length
+            if key_end > size:
+                return records, pos, 'truncated_key' if final else None, key_end + 1
+            key_bytes = bytes(view[key_start:key_end])
+            try:
+                key = key_bytes.decode(encoding='utf-8')
+            except UnicodeDecodeError:
+                print(f'[+] _parse_record_buffer() - Error trying to decode {key_bytes!r}. breaking')
+                return records, pos, 'key_decode_error', 0
+
+            # Parse the value length - 0 means the key-value pair was removed
+            value_length, bytes_read = decode_unsigned_varint_from_bytes(view, key_end, mask=32)
+            if (value_length, bytes_read) == (-1, -1):
+                return records, pos, 'value_length_error' if final else None, size + 1
+            value_start = key_end + bytes_read
+            value_end = value_start + value_length
+            if value_end > size:
+                return records, pos, 'truncated_value' if final else None, value_end
+
+            value_bytes = bytes(view[value_start:value_end]) if value_length else None
+            records.append((base + pos, key, value_bytes))
+            pos = value_end
+
+    return records, pos, 'end_of_data', 0
+
+
+class AsyncMMKVParser:
+    """
+    AsyncMMKVParser is the asyncio counterpart of `MMKVParser` for ingesting MMKV files from an
+    async stream (eg. `asyncio.StreamReader` or anything with an awaitable `read(n)`).
+    The stream is read in `chunk_size` chunks, decrypted chunk by chunk when a key is given,
+    and records are yielded as soon as they are complete. Decryption and record parsing can be
+    handed to a `concurrent.futures` thread pool via `executor` to keep the event loop free.
+    """
+
+    def __init__(self, reader: Any, crc_file_data: Union[str, bytes, BufferedIOBase, None] = None,
+                 key: Union[str, bytes, None] = None, chunk_size: int = 64 * 1024, executor: Any = None):
+        """
+        :param reader: async stream of the MMKV file with an awaitable `read(n)`
+        :param crc_file_data: hexstring, bytes or `BufferedIOBase` of the `.crc` file, optional
+        :param key: AES key (bytes or hexstring) for encrypted files - requires `crc_file_data` for the IV
+        :param chunk_size: number of bytes requested per read
+        :param executor: optional executor for decryption and parsing, None runs them inline
+        """
+        self.reader = reader
+        self.key = key
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.meta: Optional[MMKVMetaInfo] = None
+        self.crc_valid: Optional[bool] = None
+        self.stop_reason: Optional[str] = None
+        self.decoded_map: DefaultDict[str, List[bytes]] = defaultdict(list)
+
+        if isinstance(crc_file_data, (bytes, bytearray)):
+            crc_file_data = BytesIO(crc_file_data)
+        crc_file = MMKVParser._to_stream(crc_file_data, 'crc_file_data')
+        if crc_file:
+            self.meta = MMKVMetaInfo.from_bytes(crc_file.read(MMKVMetaInfo.FULL_SIZE))
+        if key is not None and not self.meta:
+            raise ValueError('[+] A .crc file is needed for the IV when decrypting.')
+
+    async def _offload(self, fn: Callable, *args) -> Any:
+        """
+        Runs `fn(*args)` on `self.executor`, or inline if there is none.
+        """
+        if self.executor is None:
+            return fn(*args)
+
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _read_chunk(self) -> bytes:
+        return await self.reader.read(self.chunk_size)
+
+    async def iter_records(self) -> AsyncIterator[Tuple[int, str, Optional[bytes]]]:
+        """
+        Reads and parses the MMKV file, yielding every record in log order as (offset, key, value_bytes),
+        with a value of None for removed key-value pairs.
+
+        :return: an async iterator of (absolute record offset, key, value bytes or None)
+        """
+        decryptor = _aes_cfb_decryptor(self.key, self.meta.iv) if self.key is not None else None
+        crc = 0
+        crc_remaining = self.meta.actual_size if self.meta and self.meta.has_actual_size() else None
+
+        # Read in first 4 header bytes - [0:4] is total size, and never encrypted
+        raw = bytearray()
+        eof = False
+        while len(raw) < 4 and not eof:
+            chunk = await self._read_chunk()
+            eof = not chunk
+            raw += chunk
+        if len(raw) < 4:
+            raise ValueError('[+] Error while reading mmkv_file. Header bytes was not 4 bytes.')
+
+        # Same bound as `MMKVParser._get_data_end()`
+        if crc_remaining is not None:
+            end = 4 + crc_remaining
+        else:
+            db_size = struct.unpack('<I', raw[0:4])[0]
+            end = 4 + (db_size or 2 ** 32)
+
+        async def feed(data: bytes) -> bytes:
+            nonlocal crc, crc_remaining
+            if crc_remaining is not None and crc_remaining > 0:
+                crc = zlib.crc32(data[:crc_remaining], crc)
+                crc_remaining -= min(len(data), crc_remaining)
+            if decryptor is not None:
+                data = await self._offload(decryptor.update, data)
+            return data
+
+        buffer = bytearray(await feed(bytes(raw[4:])))
+        base = 4
+
+        # [4:X] is garbage bytes basically (0xffffff07) or is another varint
+        while True:
+            x, bytes_read = decode_unsigned_varint_from_bytes(buffer, 0)
+            if bytes_read != -1:
+                break
+            if eof:
+                raise ValueError('[+] Error while decoding the [4:X] bytes of the mmkv_file.')
+            chunk = await self._read_chunk()
+            eof = not chunk
+            buffer += await feed(chunk)
+        del buffer[:bytes_read]
+        base += bytes_read
+
+        # Parse whatever is buffered, then read more until the data region is covered.
+        # `pos` is the next unparsed record in `buffer` and `needed` the buffer length required to
+        # finish the record that was cut off, so a large value is read in full before parsing again.
+        pos = 0
+        needed = 0
+        while True:
+            final = eof or base + len(buffer) >= end
+            if final or len(buffer) >= needed:
+                records, pos, stop_reason, needed = await self._offload(
+                    _parse_record_buffer, buffer, pos, base, end, final)
+                for record in records:
+                    yield record
+
+                if stop_reason is not None:
+                    self.stop_reason = stop_reason
+                    break
+
+                # Drop the parsed prefix once it is most of the buffer, keeping compaction amortized O(n)
+                if pos > len(buffer) // 2:
+                    del buffer[:pos]
+                    base += pos
+                    needed -= pos
+                    pos = 0
+
+            chunk = await self._read_chunk()
+            eof = not chunk
+            buffer += await feed(chunk)
+
+        # Only conclusive if the whole data region was read
+        if self.meta and self.meta.has_actual_size() and crc_remaining == 0:
+            self.crc_valid = crc == self.meta.crc_digest
+
+    async def decode_into_map(self) -> DefaultDict[str, List[bytes]]:
+        """
+        Async equivalent of `MMKVParser.decode_into_map()`.
+
+        :return: a built up defaultdict, which is also an instance variable
+        """
+        self.decoded_map = defaultdict(list)
+        async for _, key, value_bytes in self.iter_records():
+            if value_bytes is not None:
+                self.decoded_map[key].insert(0, value_bytes)
+        return self.decoded_map
+
+
+"""
+Lazy decoders for nested blobs stored as MMKV values (protobuf messages and binary plists such as
+NSKeyedArchiver archives). Only the top level is parsed up front; subtrees are decoded the first
+time they are accessed and memoized, so browsing a large archived object stays cheap.
+"""
+
+
+class LazyProtobufMessage:
+    """
+    LazyProtobufMessage walks the protobuf wire format of `data` one level at a time.
+    `fields` holds (field_number, wire_type, value) in wire order, where value is an int for varints
+    and a memoryview for fixed32/fixed64/length-delimited fields. Length-delimited fields can be
+    expanded into child messages on demand via `expand()`.
+    """
+
+    WIRE_VARINT = 0
+    WIRE_FIXED64 = 1
+    WIRE_LENGTH_DELIMITED = 2
+    WIRE_FIXED32 = 5
+
+    def __init__(self, data: Union[bytes, memoryview]):
+        self.data = memoryview(data)
+        self._fields: Optional[List[Tuple[int, int, Any]]] = None
+        self._children: Dict[int, Optional['LazyProtobufMessage']] = {}
+
+    @classmethod
+    def try_parse(cls, data: Union[bytes, memoryview]) -> Optional['LazyProtobufMessage']:
+        """
+        Returns a message if the top level of `data` is well-formed wire format, else None.
+        """
+        message = cls(data)
+        try:
+            message.fields
+        except ValueError:
+            return None
+        return message
+
+    @property
+    def fields(self) -> List[Tuple[int, int, Any]]:
+        if self._fields is None:
+            self._fields = self._parse_top_level()
+        return self._fields
+
+    def _parse_top_level(self) -> List[Tuple[int, int, Any]]:
+        data = self.data
+        fields = []
+        pos = 0
+        while pos < len(data):
+            tag, bytes_read = decode_unsigned_varint_from_bytes(data, pos, mask=64)
+            if bytes_read == -1 or tag >> 3 == 0:
+                raise ValueError(f'[+] Invalid protobuf tag at offset {pos}.')
+            pos += bytes_read
+            field_number, wire_type = tag >> 3, tag & 0x7
+
+            if wire_type == self.WIRE_VARINT:
+                value, bytes_read = decode_unsigned_varint_from_bytes(data, pos, mask=64)
+                if bytes_read == -1:
+                    raise ValueError(f'[+] Truncated protobuf varint at offset {pos}.')
+                pos += bytes_read
+            elif wire_type in (self.WIRE_FIXED64, self.WIRE_FIXED32):
+                size = 8 if wire_type == self.WIRE_FIXED64 else 4
+                value = data[pos:pos + size]
+                pos += size
+            elif wire_type == self.WIRE_LENGTH_DELIMITED:
+                length, bytes_read = decode_unsigned_varint_from_bytes(data, pos, mask=64)
+                if bytes_read == -1:
+                    raise ValueError(f'[+] Truncated protobuf length at offset {pos}.')
+                pos += bytes_read
+                value = data[pos:pos + length]
+                pos += length
+            else:
+                raise ValueError(f'[+] Unsupported protobuf wire type {wire_type} at offset {pos}.')
+
+            if pos > len(data):
+                raise ValueError('[+] Protobuf field runs past the end of the data.')
+            fields.append((field_number, wire_type, value))
+        return fields
+
+    def expand(self, index: int) -> Optional['LazyProtobufMessage']:
+        """
+        Decodes the length-delimited field at `fields[index]` as a nested message. The result
+        (None if it isn't a message, eg. a string) is memoized.
+
+        :param index: index into `fields`
+        :return: the child message or None
+        """
+        if index not in self._children:
+            _, wire_type, value = self.fields[index]
+            child = None
+            if wire_type == self.WIRE_LENGTH_DELIMITED and len(value):
+                child = LazyProtobufMessage.try_parse(value)
+            self._children[index] = child
+        return self._children[index]
+
+
+class PlistUID(int):
+    """
+    A binary plist UID, used by NSKeyedArchiver to reference entries of `$objects`.
+    """
+
+
+class LazyPlistArray:
+    """
+    A binary plist array/set whose elements are only decoded when indexed.
+    """
+
+    def __init__(self, plist: 'LazyBinaryPlist', refs: List[int]):
+        self.plist = plist
+        self.refs = refs
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __getitem__(self, index: int) -> Any:
+        return self.plist.object(self.refs[index])
+
+    def __iter__(self):
+        return (self.plist.object(ref) for ref in self.refs)
+
+
+class LazyPlistDict:
+    """
+    A binary plist dict whose keys are decoded on first lookup and values only when accessed.
+    """
+
+    def __init__(self, plist: 'LazyBinaryPlist', key_refs: List[int], value_refs: List[int]):
+        self.plist = plist
+        self.key_refs = key_refs
+        self.value_refs = value_refs
+        self._index: Optional[Dict[Any, int]] = None
+
+    def _key_index(self) -> Dict[Any, int]:
+        if self._index is None:
+            self._index = {self.plist.object(key_ref): value_ref
+                           for key_ref, value_ref in zip(self.key_refs, self.value_refs)}
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.key_refs)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._key_index()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.plist.object(self._key_index()[key])
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> List[Any]:
+        return list(self._key_index())
+
+
+class LazyBinaryPlist:
+    """
+    LazyBinaryPlist reads a "bplist00" blob object by object. Only the trailer and offset table are
+    parsed up front; `object(ref)` decodes a single object and memoizes it. Arrays and dicts come back
+    as `LazyPlistArray`/`LazyPlistDict`, so nested containers are only decoded as they're walked.
+    For NSKeyedArchiver archives, `archive_root()` and `resolve()` follow the `$objects` UIDs.
+    """
+
+    MAGIC = b'bplist00'
+
+    def __init__(self, data: Union[bytes, memoryview]):
+        self.data = memoryview(data)
+        if len(self.data) < 40 or bytes(self.data[:8]) != self.MAGIC:
+            raise ValueError('[+] Not a binary plist.')
+
+        # Trailer: 6 unused bytes, offset int size, object ref size, object count, top object, offset table offset
+        self.offset_size, self.ref_size, num_objects, self.top, table_offset = \
+            struct.unpack('>6xBBQQQ', self.data[-32:])
+        table_end = table_offset + num_objects * self.offset_size
+        if table_end > len(self.data) - 32 or self.top >= num_objects:
+            raise ValueError('[+] Binary plist trailer is out of bounds.')
+        self.offsets = [self._read_uint(table_offset + i * self.offset_size, self.offset_size)
+                        for i in range(num_objects)]
+        self._cache: Dict[int, Any] = {}
+
+        # Objects live between the header and the offset table
+        self.objects_end = table_offset
+
+    def _check_bounds(self, pos: int, size: int):
+        if pos < len(self.MAGIC) or pos + size > self.objects_end:
+            raise ValueError(f'[+] Binary plist object at {pos} (+{size} bytes) is out of bounds.')
+
+    def _read_uint(self, pos: int, size: int) -> int:
+        return int.from_bytes(self.data[pos:pos + size], 'big')
+
+    def _read_length(self, info: int, pos: int) -> Tuple[int, int]:
+        # A low nibble of 0xF means the length follows as an int object
+        if info != 0xF:
+            return info, pos
+        self._check_bounds(pos, 1)
+        size = 1 << (self.data[pos] & 0xF)
+        self._check_bounds(pos + 1, size)
+        return self._read_uint(pos + 1, size), pos + 1 + size
+
+    def _read_refs(self, pos: int, count: int) -> List[int]:
+        self._check_bounds(pos, count * self.ref_size)
+        refs = [self._read_uint(pos + i * self.ref_size, self.ref_size) for i in range(count)]
+        if any(ref >= len(self.offsets) for ref in refs):
+            raise ValueError('[+] Binary plist object reference is out of bounds.')
+        return refs
+
+    @property
+    def root(self) -> Any:
+        return self.object(self.top)
+
+    def object(self, ref: int) -> Any:
+        """
+        Decodes (once) and returns the object at `ref`.
+
+        :param ref: index into the offset table
+        :return: decoded object; containers are lazy
+        """
+        if not 0 <= ref < len(self.offsets):
+            raise ValueError(f'[+] Binary plist object reference {ref} is out of bounds.')
+        if ref not in self._cache:
+            self._cache[ref] = self._decode_object(self.offsets[ref])
+        return self._cache[ref]
+
+    def _decode_object(self, pos: int) -> Any:
+        self._check_bounds(pos, 1)
+        marker = self.data[pos]
+        kind, info = marker >> 4, marker & 0xF
+        pos += 1
+
+        if kind == 0x0:
+            return {0x0: None, 0x8: False, 0x9: True}.get(info)
+        if kind == 0x1:
+            size = 1 << info
+            self._check_bounds(pos, size)
+            return int.from_bytes(self.data[pos:pos + size], 'big', signed=size >= 8)
+        if kind in (0x2, 0x3):
+            size = 1 << info if kind == 0x2 else 8
+            if size not in (4, 8):
+                raise ValueError(f'[+] Unsupported binary plist real size {size}.')
+            self._check_bounds(pos, size)
+            return struct.unpack('>f' if size == 4 else '>d', self.data[pos:pos + size])[0]
+        if kind == 0x8:
+            self._check_bounds(pos, info + 1)
+            return PlistUID(self._read_uint(pos, info + 1))
+
+        length, pos = self._read_length(info, pos)
+        if kind == 0x4:
+            self._check_bounds(pos, length)
+            return bytes(self.data[pos:pos + length])
+        if kind == 0x5:
+            self._check_bounds(pos, length)
+            return bytes(self.data[pos:pos + length]).decode('ascii')
+        if kind == 0x6:
+            self._check_bounds(pos, length * 2)
+            return bytes(self.data[pos:pos + length * 2]).decode('utf-16-be')
+        if kind in (0xA, 0xC):
+            return LazyPlistArray(self, self._read_refs(pos, length))
+        if kind == 0xD:
+            return LazyPlistDict(self, self._read_refs(pos, length), self._read_refs(pos + length * self.ref_size, length))
+        raise ValueError(f'[+] Unsupported binary plist marker {marker:#04x}.')
+
+    def is_keyed_archive(self) -> bool:
+        root = self.root
+        return isinstance(root, LazyPlistDict) and '$archiver' in root and '$objects' in root
+
+    def resolve(self, value: Any) -> Any:
+        """
+        Follows an NSKeyedArchiver UID into `$objects`; other values are returned as is.
+        """
+        if isinstance(value, PlistUID):
+            return self.root['$objects'][value]
+        return value
+
+    def archive_root(self) -> Any:
+        """
+        Returns the root object of an NSKeyedArchiver archive (`$top.root` resolved).
+        """
+        return self.resolve(self.root['$top']['root'])
@@ -0,0 +1,323 @@
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Optional, List, Tuple, DefaultDict, Dict
+from urllib.parse import urlparse, parse_qs
+
+from mmkv_parser import MMKVParser, MMKVMetaInfo
+
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+"""
+A long-lived local service that keeps recently parsed MMKV files in memory, so scripts, notebooks
+and the frontend can share one parse per file instead of each building a new `MMKVParser`.
+Only the standard library is used and the server binds to localhost, so it works fully offline.
+
+    python mmkv_service.py --port 8765 --max-mb 256
+    curl 'http://127.0.0.1:8765/keys?path=/data/mmkv.default'
+"""
+
+# Chunk size used when hashing file contents
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """
+    Returns the BLAKE2b hex digest of the file at `path`, read in chunks.
+
+    :param path: file to hash
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParsedFile:
+    """
+    ParsedFile is a cache entry: the decoded map and `.crc` metadata of one MMKV file, along with
+    the content hash and the `stat()` state it was last confirmed against.
+    """
+
+    def __init__(self, path: Path, decoded_map: DefaultDict[str, List[bytes]], meta: Optional[MMKVMetaInfo],
+                 content_hash: str):
+        self.path = path
+        self.decoded_map = decoded_map
+        self.meta = meta
+        self.content_hash = content_hash
+
+        # Key of this entry in `ParsedFileCache._entries`, set when it's inserted
+        self.key: Optional[Tuple] = None
+
+        # (path, size, mtime_ns, crc state, AES key) this entry is currently reachable by - see `ParsedFileCache`
+        self.stat_key: Optional[Tuple] = None
+
+        # Approximate memory footprint, used for the LRU bound - includes the Python object overhead
+        # of the map, its key strings, value lists and value bytes, which dominates for small records
+        self.size = sys.getsizeof(decoded_map) + sum(
+            sys.getsizeof(key) + sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+            for key, values in decoded_map.items())
+
+
+class ParsedFileCache:
+    """
+    ParsedFileCache is a thread-safe LRU of `ParsedFile`s bounded by their approximate size in bytes
+    (`sys.getsizeof()` of the decoded map's objects, so the bound is an estimate rather than exact).
+    Entries are keyed by (path, content hash, crc file state, AES key), and each entry is also reachable
+    by the (path, size, mtime) it was last seen with:
+    - an unchanged stat whose mtime is older than `REHASH_WINDOW` seconds is a hit for the cost of a `stat()`
+    - a recently modified file (which could change again within the mtime granularity) or a changed stat
+      is re-hashed; if the content is the same (eg. a `touch`), the parse is reused instead of re-parsed
+    Hashing and parsing happen outside the lock, so one large file never blocks other requests.
+    """
+
+    # Files modified within this many seconds are re-hashed even if their stat is unchanged
+    REHASH_WINDOW = 2.0
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple, ParsedFile]' = OrderedDict()
+
+        # stat key -> entry key, one per cached entry and dropped with it
+        self._by_stat: Dict[Tuple, Tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _crc_state(crc_path: Optional[Path]) -> Optional[Tuple[str, int, int]]:
+        if crc_path is None:
+            return None
+        crc_stat = crc_path.stat()
+        return str(crc_path), crc_stat.st_size, crc_stat.st_mtime_ns
+
+    def get(self, path: Path, crc_path: Optional[Path] = None, key: Optional[str] = None) -> ParsedFile:
+        """
+        Returns the parsed `path`, parsing (and decrypting with `key`) on a miss.
+
+        :param path: MMKV file
+        :param crc_path: optional `.crc` file
+        :param key: optional hexstring AES key for encrypted files
+        :return: the `ParsedFile`
+        """
+        path = Path(path).resolve()
+        crc_path = Path(crc_path).resolve() if crc_path else None
+        stat = path.stat()
+        crc_state = self._crc_state(crc_path)
+        stat_key = (str(path), stat.st_size, stat.st_mtime_ns, crc_state, key)
+        recently_modified = time.time() - stat.st_mtime < self.REHASH_WINDOW
+
+        # 1. Same stat as a cached entry and not recently modified - trust it
+        with self._lock:
+            entry_key = self._by_stat.get(stat_key)
+            if entry_key is not None and not recently_modified:
+                return self._hit(entry_key)
+
+        # 2. Same content as a cached entry
+        content_hash = hash_file(path)
+        entry_key = (str(path), content_hash, crc_state, key)
+        with self._lock:
+            if entry_key in self._entries:
+                self._remap(self._entries[entry_key], stat_key)
+                return self._hit(entry_key)
+            self.misses += 1
+
+        # 3. Parse
+        entry = self._parse(path, crc_path, key, content_hash)
+        with self._lock:
+            if entry_key in self._entries:
+                entry = self._entries[entry_key]
+            else:
+                entry.key = entry_key
+                self._entries[entry_key] = entry
+                self.current_bytes += entry.size
+            self._remap(entry, stat_key)
+            self._evict()
+        return entry
+
+    def _hit(self, entry_key: Tuple) -> ParsedFile:
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return self._entries[entry_key]
+
+    def _remap(self, entry: ParsedFile, stat_key: Tuple):
+        # Point `stat_key` at `entry`, dropping whatever stat the entry was reachable by before
+        self._unmap(entry)
+        previous_key = self._by_stat.get(stat_key)
+        if previous_key is not None and previous_key != entry.key:
+            self._entries[previous_key].stat_key = None
+        entry.stat_key = stat_key
+        self._by_stat[stat_key] = entry.key
+
+    def _unmap(self, entry: ParsedFile):
+        if entry.stat_key is not None and self._by_stat.get(entry.stat_key) == entry.key:
+            del self._by_stat[entry.stat_key]
+        entry.stat_key = None
+
+    @staticmethod
+    def _parse(path: Path, crc_path: Optional[Path], key: Optional[str], content_hash: str) -> ParsedFile:
+        with open(path, 'rb') as f:
+            crc_file = open(crc_path, 'rb') if crc_path else None
+            try:
+                mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=crc_file)
+                if key:
+                    mmkv_parser.decrypt_and_reconstruct(key)
+                decoded_map = mmkv_parser.decode_into_map()
+            finally:
+                if crc_file:
+                    crc_file.close()
+        return ParsedFile(path, decoded_map, mmkv_parser.meta, content_hash)
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds `max_bytes`
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self._unmap(entry)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'paths': [str(entry.path) for entry in self._entries.values()],
+            }
+
+
+class MMKVRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints, all taking `path` and optionally `crc` query parameters; the hexstring AES key of an
+    encrypted file goes in the `X-MMKV-Key` header (a `key` query parameter also works, but is redacted from logs):
+        GET /keys                          -> list of keys
+        GET /history?name=<key>            -> every value of a key as hex, newest first
+        GET /value?name=<key>&type=<type>  -> newest value decoded via `MMKVParser.decode_as_<type>()`
+        GET /stats                         -> cache statistics
+    Requests whose `Host` header isn't localhost are refused, so a web page can't reach the service through
+    DNS rebinding; when `roots` is set, only files under those directories are served.
+    """
+
+    # Set by `make_server()`
+    cache: ParsedFileCache = None
+    roots: Optional[List[Path]] = None
+
+    ALLOWED_HOSTS = ('127.0.0.1', 'localhost')
+
+    KEY_HEADER = 'X-MMKV-Key'
+    KEY_PARAMETER = re.compile(r'([?&]key=)[^&\s]*')
+
+    DECODE_TYPES = ('int32', 'int64', 'uint32', 'uint64', 'string', 'bytes', 'data', 'float', 'bool')
+
+    def _send_json(self, status: int, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _host_allowed(self) -> bool:
+        host = self.headers.get('Host', '')
+        hostname = urlparse(f'//{host}').hostname
+        return hostname in self.ALLOWED_HOSTS
+
+    def _path_allowed(self, path: Optional[str]) -> bool:
+        if path is None or self.roots is None:
+            return True
+        resolved = Path(path).resolve()
+        return any(resolved == root or root in resolved.parents for root in self.roots)
+
+    def do_GET(self):
+        if not self._host_allowed():
+            return self._send_json(403, {'error': 'forbidden host'})
+
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        if url.path == '/stats':
+            return self._send_json(200, self.cache.to_dict())
+        if url.path not in ('/keys', '/history', '/value'):
+            return self._send_json(404, {'error': f'unknown endpoint {url.path}'})
+        if 'path' not in query:
+            return self._send_json(400, {'error': 'missing "path" parameter'})
+        if not (self._path_allowed(query['path']) and self._path_allowed(query.get('crc'))):
+            return self._send_json(403, {'error': 'path outside of the served roots'})
+
+        try:
+            key = self.headers.get(self.KEY_HEADER) or query.get('key')
+            entry = self.cache.get(query['path'], query.get('crc'), key)
+        except (OSError, ValueError, TypeError) as e:
+            return self._send_json(400, {'error': str(e)})
+
+        if url.path == '/keys':
+            return self._send_json(200, list(entry.decoded_map.keys()))
+
+        name = query.get('name')
+        if name not in entry.decoded_map:
+            return self._send_json(404, {'error': f'key {name!r} not found'})
+        values = entry.decoded_map[name]
+
+        if url.path == '/history':
+            return self._send_json(200, [value.hex() for value in values])
+
+        decode_type = query.get('type', 'data')
+        if decode_type not in self.DECODE_TYPES:
+            return self._send_json(400, {'error': f'unknown type {decode_type!r}'})
+        value = getattr(MMKVParser, f'decode_as_{decode_type}')(values[0])
+        if isinstance(value, bytes):
+            value = value.hex()
+        return self._send_json(200, value)
+
+    def log_message(self, format, *args):
+        # Never log AES keys passed in the URL
+        message = self.KEY_PARAMETER.sub(r'\1<redacted>', format % args)
+        print(f'[+] mmkv_service - {message}')
+
+
+def make_server(port: int = 8765, max_bytes: int = 256 * 1024 * 1024,
+                cache: Optional[ParsedFileCache] = None, roots: Optional[List[str]] = None) -> ThreadingHTTPServer:
+    """
+    Builds (but doesn't start) the service bound to 127.0.0.1.
+
+    :param port: TCP port, 0 picks a free one
+    :param max_bytes: LRU bound when no `cache` is given
+    :param cache: optional shared `ParsedFileCache`
+    :param roots: optional directories to restrict served files to
+    :return: the server; call `serve_forever()` on it
+    """
+    handler = type('BoundMMKVRequestHandler', (MMKVRequestHandler,),
+                   {'cache': cache or ParsedFileCache(max_bytes),
+                    'roots': [Path(root).resolve() for root in roots] if roots else None})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description='Local MMKV parse service with an LRU cache of parsed files.')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--max-mb', type=int, default=256, help='memory bound of the parsed-file cache')
+    arg_parser.add_argument('--root', action='append', help='only serve files under this directory (repeatable)')
+    args = arg_parser.parse_args(argv)
+
+    server = make_server(args.port, args.max_mb * 1024 * 1024, roots=args.root)
+    print(f'[+] mmkv_service listening on http://127.0.0.1:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,28 @@
+import os
 import sys
+import json
+import struct
+import plistlib
+import shutil
+import asyncio
+import tempfile
+import threading
 import unittest
 
 sys.path.append('../../frontend/public')  # Used for the `src` relative import
 
-from io import BytesIO
+from io import BytesIO, StringIO
+from contextlib import redirect_stdout
 from collections import defaultdict
-from mmkv_parser import MMKVParser, decode_unsigned_varint, decode_signed_varint
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from urllib.parse import quote
+from mmkv_service import ParsedFileCache, make_server
+from mmkv_index import MMKVKeyIndex
+import mmkv_index
+from mmkv_parser import MMKVParser, AsyncMMKVParser, MMKVMetaInfo, LazyBinaryPlist, LazyProtobufMessage, LazyPlistDict
+from mmkv_parser import decode_unsigned_varint, decode_signed_varint
 
 
 class TestVarintDecoder(unittest.TestCase):
@@ -179,5 +196,647 @@ class TestMMKVParser(unittest.TestCase):
 			self.assertEqual(mmkv_map, m)
 
 
+class TestMMKVMetaInfo(unittest.TestCase):
+	"""
+	Test Class for the .crc metadata model and the CRC/sequence driven parsing
+	"""
+	def test_meta_from_crc_file(self):
+		with open('data_string_keypair_with_remove.crc', 'rb') as c:
+			meta = MMKVMetaInfo.from_bytes(c.read())
+			self.assertEqual(meta.crc_digest, 0xccb4da41)
+			self.assertEqual(meta.version, 3)
+			self.assertEqual(meta.sequence, 2)
+			self.assertEqual(meta.actual_size, 30)
+			self.assertFalse(meta.is_encrypted())
+
+	def test_meta_too_short(self):
+		with self.assertRaises(ValueError):
+			MMKVMetaInfo.from_bytes(b'\x00' * 27)
+
+	def test_verify_crc(self):
+		with open('data_all_types', 'rb') as f, open('data_all_types.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			self.assertTrue(mmkv_parser.verify_crc())
+			self.assertEqual(len(mmkv_parser.decode_into_map()), 9)
+
+	def test_verify_crc_mismatch(self):
+		with open('data_all_types', 'rb') as f, open('data_all_types.crc', 'rb') as c:
+			data = bytearray(f.read())
+			data[10] ^= 0xff
+			mmkv_parser = MMKVParser(mmkv_file_data=BytesIO(bytes(data)), crc_file_data=c)
+			self.assertFalse(mmkv_parser.verify_crc())
+
+	def test_decrypt_verifies_crc(self):
+		with open('data_encrypt', 'rb') as f, open('data_encrypt.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			mmkv_parser.decrypt_and_reconstruct(key=b'kindalongsecretkey'[:16])
+			self.assertTrue(mmkv_parser.crc_valid)
+
+	def test_decode_decrypt_decode(self):
+		with open('data_encrypt', 'rb') as f, open('data_encrypt.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			self.assertEqual(mmkv_parser.decode_into_map(), {})
+			mmkv_parser.decrypt_and_reconstruct(key=b'kindalongsecretkey'[:16])
+			self.assertEqual(len(mmkv_parser.decode_into_map()), 4)
+
+	def test_decrypt_retry_with_another_key(self):
+		with open('data_encrypt', 'rb') as f, open('data_encrypt.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			mmkv_parser.decrypt_and_reconstruct(key=b'wrongkey')
+			mmkv_parser.decode_into_map()
+			mmkv_parser.decrypt_and_reconstruct(key=b'kindalongsecretkey'[:16])
+			self.assertEqual(mmkv_parser.decode_into_map()['name'], [b'\x06steven'])
+
+	def test_verify_crc_not_seekable(self):
+		class NonSeekable(BytesIO):
+			def seekable(self):
+				return False
+		with open('data_all_types', 'rb') as f, open('data_all_types.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=NonSeekable(f.read()), crc_file_data=c)
+			self.assertIsNone(mmkv_parser.verify_crc())
+			self.assertEqual(len(mmkv_parser.decode_into_map()), 9)
+
+	def test_meta_flags_round_trip(self):
+		with open('data_all_types.crc', 'rb') as c:
+			meta = MMKVMetaInfo.from_bytes(c.read())
+		meta.flags = 1 << 40
+		data = meta.to_bytes()
+		self.assertEqual(len(data), MMKVMetaInfo.FULL_SIZE)
+		self.assertEqual(MMKVMetaInfo.from_bytes(data).flags, 1 << 40)
+
+	def test_reload_unchanged_skips_parse(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f, open('data_int32_keypair_with_updates.crc', 'rb') as c:
+			mmkv_data, crc_data = f.read(), c.read()
+		mmkv_parser = MMKVParser(mmkv_file_data=BytesIO(mmkv_data), crc_file_data=BytesIO(crc_data))
+		mmkv_map = mmkv_parser.decode_into_map()
+
+		# Same sequence and digest - the garbage mmkv data must not be parsed
+		mmkv_parser.reload(BytesIO(b'\xff' * 16), BytesIO(crc_data))
+		self.assertIs(mmkv_parser.decode_into_map(), mmkv_map)
+
+	def test_reload_changed_reparses(self):
+		with open('data_int32_keypair', 'rb') as f, open('data_int32_keypair.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			mmkv_parser.decode_into_map()
+		with open('data_all_types', 'rb') as f, open('data_all_types.crc', 'rb') as c:
+			mmkv_parser.reload(f, c)
+			self.assertEqual(len(mmkv_parser.decode_into_map()), 9)
+
+
+class TestMMKVParseStats(unittest.TestCase):
+	"""
+	Test Class for the opt-in parse statistics
+	"""
+	def test_stats_disabled_by_default(self):
+		with open('data_int32_keypair', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.decode_into_map()
+			self.assertIsNone(mmkv_parser.stats)
+
+	def test_stats_counters(self):
+		with open('data_int32_keypair_with_remove', 'rb') as f, open('data_int32_keypair_with_remove.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			stats = mmkv_parser.enable_stats()
+			mmkv_parser.decode_into_map()
+			d = stats.to_dict()
+			self.assertEqual(d['records'], 1)
+			self.assertEqual(d['tombstones'], 1)
+			self.assertEqual(d['peak_map_size'], 1)
+			self.assertEqual(d['key_bytes'], 6)
+			self.assertEqual(d['value_bytes'], 2)
+			self.assertEqual(d['bytes_parsed'], 4 + 16)
+			self.assertEqual(d['stop_reason'], 'end_of_data')
+			self.assertEqual(d['errors'], 0)
+			for phase in ('crc', 'varint', 'key_decode', 'map_build'):
+				self.assertIn(phase, d['wall_times'])
+				self.assertIn(phase, d['cpu_times'])
+
+	def test_stats_describe_one_pass(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f, open('data_int32_keypair_with_updates.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			stats = mmkv_parser.enable_stats()
+			mmkv_parser.decode_into_map()
+			mmkv_parser.state_at(ordinal=2)
+			# Checkpoint build, then a replay that stops right at the target
+			self.assertEqual(stats.records, 4 + 2)
+			mmkv_parser.analyze_churn()
+			self.assertEqual(stats.records, 4)
+			self.assertEqual(stats.bytes_parsed, 4 + 45)
+
+			mmkv_parser.decode_into_map()
+			self.assertEqual(stats.stop_reason, 'unchanged')
+			self.assertEqual(stats.records, 0)
+
+	def test_stats_decrypt_then_decode(self):
+		with open('data_encrypt', 'rb') as f, open('data_encrypt.crc', 'rb') as crc:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=crc)
+			stats = mmkv_parser.enable_stats()
+			mmkv_parser.decrypt_and_reconstruct(b'kindalongsecretkey')
+			mmkv_parser.decode_into_map()
+			wall_times = stats.to_dict()['wall_times']
+			self.assertIn('decrypt', wall_times)
+			self.assertIn('crc', wall_times)
+			self.assertIn('map_build', wall_times)
+			mmkv_parser.decode_latest()
+			self.assertNotIn('decrypt', stats.to_dict()['wall_times'])
+
+	def test_stats_callback(self):
+		calls = []
+		with open('data_int32_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.enable_stats(callback=lambda s: calls.append(s.records), callback_interval=2)
+			mmkv_parser.decode_into_map()
+			self.assertEqual(calls, [2, 4])
+
+
+class TestMMKVChurn(unittest.TestCase):
+	"""
+	Test Class for the streaming key churn analytics
+	"""
+	def test_churn_updates(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			report = mmkv_parser.analyze_churn()
+			churn = report.keys['int_key']
+			self.assertEqual(report.records, 4)
+			self.assertEqual(churn.versions, 4)
+			self.assertEqual(churn.removals, 0)
+			self.assertEqual(churn.value_bytes, 1 + 1 + 1 + 2)
+			self.assertEqual(churn.avg_value_size, 5 / 4)
+			self.assertEqual(churn.avg_rewrite_distance_records, 1)
+			self.assertEqual(report.live_bytes, 1 + 7 + 1 + 2)
+			self.assertEqual(report.dead_bytes, report.total_bytes - report.live_bytes)
+
+	def test_churn_remove(self):
+		with open('data_int32_keypair_with_remove', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			report = mmkv_parser.analyze_churn()
+			churn = report.keys['key']
+			self.assertEqual((churn.versions, churn.removals), (1, 1))
+			self.assertEqual(report.live_bytes, 0)
+			self.assertEqual(report.live_ratio, 0.0)
+			self.assertEqual(churn.min_rewrite_bytes, 7)
+
+	def test_churn_after_decode(self):
+		with open('data_all_types', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.decode_into_map()
+			report = mmkv_parser.analyze_churn()
+			self.assertEqual(len(report.keys), 9)
+			self.assertEqual(report.live_ratio, 1.0)
+			self.assertEqual(report.top_keys(1, by='record_bytes')[0].key, 'string_key')
+
+
+class TestMMKVStateAt(unittest.TestCase):
+	"""
+	Test Class for point-in-time state reconstruction
+	"""
+	def test_state_at_ordinal(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.enable_checkpoints(interval=2)
+			mmkv_parser.decode_into_map()
+			self.assertEqual(mmkv_parser.record_count, 4)
+			self.assertEqual(mmkv_parser.state_at(ordinal=0), {})
+			self.assertEqual(mmkv_parser.state_at(ordinal=1), {'int_key': b'\x01'})
+			self.assertEqual(mmkv_parser.state_at(ordinal=3), {'int_key': b'\x64'})
+			self.assertEqual(mmkv_parser.state_at(ordinal=4), {'int_key': b'\xe8\x07'})
+			self.assertEqual(mmkv_parser.state_at(ordinal=100), {'int_key': b'\xe8\x07'})
+
+	def test_state_at_offset(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			self.assertEqual(mmkv_parser.state_at(offset=8), {})
+			self.assertEqual(mmkv_parser.state_at(offset=28), {'int_key': b'\x0a'})
+			self.assertEqual(mmkv_parser.state_at(offset=29), {'int_key': b'\x64'})
+
+	def test_state_at_remove(self):
+		with open('data_int32_keypair_with_remove', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			self.assertEqual(mmkv_parser.state_at(ordinal=1), {'key': b'\xdc\x22'})
+			self.assertEqual(mmkv_parser.state_at(ordinal=2), {})
+
+	def test_state_at_not_seekable(self):
+		class NonSeekable(BytesIO):
+			def seekable(self):
+				return False
+		with open('data_int32_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=NonSeekable(f.read()))
+			with self.assertRaises(ValueError):
+				mmkv_parser.state_at(ordinal=2)
+
+	def test_state_at_requires_one_point(self):
+		with open('data_int32_keypair', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			with self.assertRaises(ValueError):
+				mmkv_parser.state_at()
+
+
+class AsyncBytesReader:
+	"""
+	Minimal async stream over bytes, like `asyncio.StreamReader.read()`
+	"""
+	def __init__(self, data):
+		self.stream = BytesIO(data)
+
+	async def read(self, n):
+		await asyncio.sleep(0)
+		return self.stream.read(n)
+
+
+class TestAsyncMMKVParser(unittest.TestCase):
+	"""
+	Test Class for the asyncio parsing API
+	"""
+	def decode(self, name, chunk_size, **kwargs):
+		with open(name, 'rb') as f:
+			parser = AsyncMMKVParser(AsyncBytesReader(f.read()), chunk_size=chunk_size, **kwargs)
+		return parser, asyncio.run(parser.decode_into_map())
+
+	def test_async_matches_sync(self):
+		for name in ('data_all_types', 'data_string_keypair_with_updates', 'data_int32_keypair_with_remove'):
+			with open(name, 'rb') as f:
+				expected = MMKVParser(mmkv_file_data=f).decode_into_map()
+			for chunk_size in (1, 7, 64 * 1024):
+				self.assertEqual(self.decode(name, chunk_size)[1], expected)
+
+	def test_async_records(self):
+		async def collect():
+			with open('data_int32_keypair_with_remove', 'rb') as f:
+				parser = AsyncMMKVParser(AsyncBytesReader(f.read()), chunk_size=3)
+			return [record async for record in parser.iter_records()]
+		self.assertEqual(asyncio.run(collect()), [(8, 'key', b'\xdc\x22'), (15, 'key', None)])
+
+	def test_async_decrypt_with_executor(self):
+		with open('data_encrypt.crc', 'rb') as c, ThreadPoolExecutor(max_workers=2) as executor:
+			parser, mmkv_map = self.decode('data_encrypt', 5, crc_file_data=c.read(),
+				key=b'kindalongsecretkey', executor=executor)
+		self.assertEqual(mmkv_map['name'], [b'\x06steven'])
+		self.assertEqual(len(mmkv_map), 4)
+		self.assertTrue(parser.crc_valid)
+		self.assertEqual(parser.stop_reason, 'end_of_data')
+
+	def test_async_large_value(self):
+		value = b'\x80\x80\x40' + b'a' * (1 << 20)
+		body = b'\xff\xff\xff\x07\x01k\x83\x80\x40' + value + b'\x01j\x01\x05'
+		data = len(body).to_bytes(4, 'little') + body
+		parser = AsyncMMKVParser(AsyncBytesReader(data), chunk_size=4096)
+		mmkv_map = asyncio.run(parser.decode_into_map())
+		self.assertEqual(mmkv_map, MMKVParser(mmkv_file_data=BytesIO(data)).decode_into_map())
+		self.assertEqual(mmkv_map['k'], [value])
+		self.assertEqual(parser.stop_reason, 'end_of_data')
+
+	def test_async_key_without_crc(self):
+		with self.assertRaises(ValueError):
+			AsyncMMKVParser(AsyncBytesReader(b''), key=b'key')
+
+
+class TestMMKVService(unittest.TestCase):
+	"""
+	Test Class for the local parse service and its parsed-file LRU cache
+	"""
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'data_all_types')
+		shutil.copy('data_all_types', self.path)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_cache_hit(self):
+		cache = ParsedFileCache()
+		entry = cache.get(self.path)
+		self.assertIs(cache.get(self.path), entry)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+	def test_cache_invalidated_on_change(self):
+		cache = ParsedFileCache()
+		cache.get(self.path)
+		shutil.copy('data_int32_keypair', self.path)
+		os.utime(self.path, ns=(1, 1))
+		self.assertEqual(list(cache.get(self.path).decoded_map), ['key'])
+		self.assertEqual(cache.misses, 2)
+
+	def test_cache_eviction(self):
+		other = os.path.join(self.tmp, 'data_int32_keypair')
+		shutil.copy('data_int32_keypair', other)
+		cache = ParsedFileCache(max_bytes=1)
+		cache.get(self.path)
+		cache.get(other)
+		self.assertEqual(cache.to_dict()['entries'], 1)
+		cache.get(self.path)
+		self.assertEqual(cache.misses, 3)
+		self.assertEqual(len(cache._by_stat), 1)
+
+	def test_cache_touch_reuses_parse(self):
+		cache = ParsedFileCache()
+		entry = cache.get(self.path)
+		os.utime(self.path, ns=(1, 1))
+		self.assertIs(cache.get(self.path), entry)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+		self.assertEqual(len(cache._by_stat), 1)
+
+	def test_cache_rehash_recent_mtime(self):
+		cache = ParsedFileCache()
+		cache.REHASH_WINDOW = float('inf')
+		cache.get(self.path)
+		stat = os.stat(self.path)
+		with open(self.path, 'rb') as f:
+			data = f.read()
+		with open(self.path, 'wb') as f:
+			f.write(data.replace(b'steven pak', b'steven pam'))
+		os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+		self.assertEqual(cache.get(self.path).decoded_map['string_key'], [b'\x0asteven pam'])
+		self.assertEqual(cache.misses, 2)
+
+	def test_cache_encrypted(self):
+		cache = ParsedFileCache()
+		entry = cache.get('data_encrypt', 'data_encrypt.crc', b'kindalongsecretkey'.hex())
+		self.assertEqual(entry.decoded_map['name'], [b'\x06steven'])
+
+	def test_http_endpoints(self):
+		server = make_server(port=0)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		base = f'http://127.0.0.1:{server.server_address[1]}'
+		try:
+			def get(endpoint):
+				with urlopen(f'{base}{endpoint}&path={quote(self.path)}') as response:
+					return json.loads(response.read())
+			self.assertEqual(len(get('/keys?')), 9)
+			self.assertEqual(get('/history?name=string_key'), ['0a73746576656e2070616b'])
+			self.assertEqual(get('/value?name=string_key&type=string'), 'steven pak')
+			self.assertEqual(get('/value?name=int32_nkey&type=int32'), -1 * (1 << 31))
+			with urlopen(f'{base}/stats') as response:
+				self.assertEqual(json.loads(response.read())['hits'], 3)
+		finally:
+			server.shutdown()
+			server.server_close()
+
+	def test_http_key_header_not_logged(self):
+		server = make_server(port=0)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		base = f'http://127.0.0.1:{server.server_address[1]}'
+		key = b'kindalongsecretkey'.hex()
+		crc = os.path.abspath('data_encrypt.crc')
+		try:
+			with redirect_stdout(StringIO()) as output:
+				request = Request(f'{base}/keys?path={quote(os.path.abspath("data_encrypt"))}&crc={quote(crc)}',
+					headers={'X-MMKV-Key': key})
+				with urlopen(request) as response:
+					self.assertIn('name', json.loads(response.read()))
+				with urlopen(f'{base}/keys?path={quote(os.path.abspath("data_encrypt"))}&crc={quote(crc)}&key={key}') as response:
+					self.assertIn('name', json.loads(response.read()))
+			self.assertNotIn(key, output.getvalue())
+			self.assertIn('key=<redacted>', output.getvalue())
+		finally:
+			server.shutdown()
+			server.server_close()
+
+	def test_cache_size_includes_overhead(self):
+		entry = ParsedFileCache().get(self.path)
+		raw = sum(len(key) + sum(len(value) for value in values) for key, values in entry.decoded_map.items())
+		self.assertGreater(entry.size, raw + 100 * len(entry.decoded_map))
+
+	def test_http_forbidden(self):
+		server = make_server(port=0, roots=[self.tmp])
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		base = f'http://127.0.0.1:{server.server_address[1]}'
+		try:
+			with self.assertRaises(HTTPError) as context:
+				urlopen(Request(f'{base}/stats', headers={'Host': 'attacker.example'}))
+			self.assertEqual(context.exception.code, 403)
+			with self.assertRaises(HTTPError) as context:
+				urlopen(f'{base}/keys?path={quote(os.path.abspath("data_all_types"))}')
+			self.assertEqual(context.exception.code, 403)
+			with urlopen(f'{base}/keys?path={quote(self.path)}') as response:
+				self.assertEqual(len(json.loads(response.read())), 9)
+		finally:
+			server.shutdown()
+			server.server_close()
+
+
+class TestNestedDecoding(unittest.TestCase):
+	"""
+	Test Class for the lazy nested blob decoders
+	"""
+	# field 1 varint 150, field 2 = message{field 1 string "hi"}, field 3 string "abc"
+	PROTOBUF = b'\x08\x96\x01\x12\x04\x0a\x02hi\x1a\x03abc'
+
+	def test_protobuf_top_level(self):
+		message = MMKVParser.decode_as_nested(self.PROTOBUF)
+		self.assertIsInstance(message, LazyProtobufMessage)
+		self.assertEqual([(n, w) for n, w, _ in message.fields], [(1, 0), (2, 2), (3, 2)])
+		self.assertEqual(message.fields[0][2], 150)
+
+	def test_protobuf_expand_memoized(self):
+		message = MMKVParser.decode_as_nested(self.PROTOBUF)
+		child = message.expand(1)
+		self.assertEqual(bytes(child.fields[0][2]), b'hi')
+		self.assertIs(message.expand(1), child)
+		self.assertIsNone(message.expand(2))
+
+	def test_protobuf_with_length_wrapper(self):
+		message = MMKVParser.decode_as_nested(bytes([len(self.PROTOBUF)]) + self.PROTOBUF)
+		self.assertEqual(len(message.fields), 3)
+
+	def test_not_nested(self):
+		with open('data_all_types', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.decode_into_map()
+			self.assertIsNone(mmkv_parser.decode_nested('string_key'))
+			self.assertIsNone(mmkv_parser.decode_nested('missing_key'))
+
+	def test_keyed_archive(self):
+		archive = plistlib.dumps({
+			'$archiver': 'NSKeyedArchiver',
+			'$version': 100000,
+			'$top': {'root': plistlib.UID(1)},
+			'$objects': ['$null', {'name': plistlib.UID(2), 'count': 3, 'tags': [1, 'two']}, 'steven'],
+		}, fmt=plistlib.FMT_BINARY)
+		plist = MMKVParser.decode_as_nested(archive)
+		self.assertIsInstance(plist, LazyBinaryPlist)
+		self.assertTrue(plist.is_keyed_archive())
+		root = plist.archive_root()
+		self.assertIsInstance(root, LazyPlistDict)
+		self.assertEqual(plist.resolve(root['name']), 'steven')
+		self.assertEqual(root['count'], 3)
+		self.assertEqual(list(root['tags']), [1, 'two'])
+		self.assertIs(plist.archive_root(), root)
+
+	def test_decode_nested_memoized(self):
+		archive = plistlib.dumps({'a': [1, 2]}, fmt=plistlib.FMT_BINARY)
+		mmkv_parser = MMKVParser(mmkv_file_data=BytesIO(b''))
+		mmkv_parser.decoded_map['blob'].insert(0, bytes([len(archive)]) + archive)
+		plist = mmkv_parser.decode_nested('blob')
+		self.assertEqual(list(plist.root['a']), [1, 2])
+		self.assertIs(mmkv_parser.decode_nested('blob'), plist)
+
+	def test_nested_cache_cleared(self):
+		with open('data_all_types', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			mmkv_parser.decode_into_map()
+			mmkv_parser.decode_nested('string_key')
+			self.assertEqual(len(mmkv_parser._nested_cache), 1)
+			mmkv_parser.decode_into_map()
+			self.assertEqual(mmkv_parser._nested_cache, {})
+			mmkv_parser.decode_nested('string_key')
+			mmkv_parser._replace_mmkv_file(BytesIO(b''))
+			self.assertEqual(mmkv_parser._nested_cache, {})
+			mmkv_parser.decoded_map['string_key'] = [b'\x01']
+			mmkv_parser.decode_nested('string_key')
+			mmkv_parser.reload(BytesIO(b''))
+			self.assertEqual(mmkv_parser._nested_cache, {})
+
+	def test_plist_corrupted_offsets(self):
+		archive = bytearray(plistlib.dumps({'a': [1, 2]}, fmt=plistlib.FMT_BINARY))
+		offset_size, table_offset = archive[-26], struct.unpack('>Q', archive[-8:])[0]
+		archive[table_offset:table_offset + offset_size] = b'\xff' * offset_size
+		with self.assertRaises(ValueError):
+			LazyBinaryPlist(bytes(archive)).root
+
+
+class TestLatestOnly(unittest.TestCase):
+	"""
+	Test Class for the latest-only view and compacted writes
+	"""
+	def test_latest_updates(self):
+		with open('data_string_keypair_with_updates', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			self.assertEqual(mmkv_parser.decode_latest(), {'string_key': b'\x04\xf0\x9f\x98\x81'})
+
+	def test_latest_remove(self):
+		with open('data_int32_keypair_with_remove', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			self.assertEqual(mmkv_parser.decode_latest(), {})
+
+	def test_write_compacted(self):
+		with open('data_int32_keypair_with_updates', 'rb') as f, open('data_int32_keypair_with_updates.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			mmkv_out, crc_out = BytesIO(), BytesIO()
+			size = mmkv_parser.write_compacted(mmkv_out, crc_out)
+		self.assertEqual(size, 4 + 1 + 7 + 1 + 2)
+		self.assertEqual(len(mmkv_out.getvalue()) % MMKVParser.COMPACT_PAGE_SIZE, 0)
+
+		mmkv_out.seek(0)
+		crc_out.seek(0)
+		compacted = MMKVParser(mmkv_file_data=mmkv_out, crc_file_data=crc_out)
+		self.assertEqual(compacted.meta.sequence, 2)
+		self.assertTrue(compacted.verify_crc())
+		self.assertEqual(compacted.decode_into_map(), {'int_key': [b'\xe8\x07']})
+
+	def test_write_compacted_all_types(self):
+		with open('data_all_types', 'rb') as f:
+			mmkv_parser = MMKVParser(mmkv_file_data=f)
+			expected = mmkv_parser.decode_into_map()
+			mmkv_out = BytesIO()
+			mmkv_parser.write_compacted(mmkv_out)
+		mmkv_out.seek(0)
+		self.assertEqual(MMKVParser(mmkv_file_data=mmkv_out).decode_into_map(), expected)
+
+	def test_write_compacted_encrypted(self):
+		with open('data_encrypt', 'rb') as f, open('data_encrypt.crc', 'rb') as c:
+			mmkv_parser = MMKVParser(mmkv_file_data=f, crc_file_data=c)
+			with self.assertRaises(ValueError):
+				mmkv_parser.write_compacted(BytesIO())
+			mmkv_parser.decrypt_and_reconstruct(b'kindalongsecretkey')
+			mmkv_out = BytesIO()
+			mmkv_parser.write_compacted(mmkv_out)
+		mmkv_out.seek(0)
+		self.assertEqual(MMKVParser(mmkv_file_data=mmkv_out).decode_into_map()['name'], [b'\x06steven'])
+
+
+class TestMMKVKeyIndex(unittest.TestCase):
+	"""
+	Test Class for the persistent cross-file key index
+	"""
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.stores = os.path.join(self.tmp, 'mmkv')
+		os.mkdir(self.stores)
+		for name in ('data_all_types', 'data_int32_keypair', 'data_int32_keypair_with_remove',
+				'data_encrypt', 'data_encrypt.crc'):
+			shutil.copy(name, self.stores)
+		self.index_path = os.path.join(self.tmp, 'index.sqlite')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_build_and_lookup(self):
+		index = MMKVKeyIndex(self.index_path)
+		summary = index.update_directory(self.stores)
+		self.assertEqual(summary, {'indexed': 3, 'encrypted': 1, 'removed': 0})
+		hits = index.lookup('key')
+		self.assertEqual([os.path.basename(hit['file']) for hit in hits],
+			['data_int32_keypair', 'data_int32_keypair_with_remove'])
+		self.assertEqual(hits[0], {'file': hits[0]['file'], 'versions': 1, 'removals': 0, 'offsets': [8], 'live': True})
+		self.assertEqual((hits[1]['removals'], hits[1]['live']), (1, False))
+		self.assertEqual(index.lookup('missing'), [])
+		index.close()
+
+	def test_persistent_and_incremental(self):
+		MMKVKeyIndex(self.index_path).update_directory(self.stores)
+		index = MMKVKeyIndex(self.index_path)
+		self.assertEqual(len(index.lookup('string_key')), 1)
+
+		changed = os.path.join(self.stores, 'data_int32_keypair')
+		shutil.copy('data_string_keypair', changed)
+		os.utime(changed, ns=(1, 1))
+		os.remove(os.path.join(self.stores, 'data_all_types'))
+		summary = index.update_directory(self.stores)
+		self.assertEqual(summary, {'indexed': 1, 'unchanged': 2, 'removed': 1})
+		self.assertEqual(index.lookup('string_key'), [])
+		self.assertEqual(len(index.lookup('key')), 2)
+		index.close()
+
+	def test_encrypted_with_key(self):
+		index = MMKVKeyIndex()
+		index.update_directory(self.stores, keys={'data_encrypt': b'kindalongsecretkey'.hex()})
+		self.assertEqual([os.path.basename(hit['file']) for hit in index.lookup('name')], ['data_encrypt'])
+		index.close()
+
+	def test_non_mmkv_files_skipped(self):
+		with open(os.path.join(self.stores, 'notes.txt'), 'wb') as f:
+			f.write(b'not an mmkv file')
+		index = MMKVKeyIndex()
+		summary = index.update_directory(self.stores)
+		self.assertEqual(summary, {'indexed': 3, 'encrypted': 1, 'skipped': 1, 'removed': 0})
+		self.assertEqual(len(index.files()), 4)
+		self.assertEqual(index.update_directory(self.stores, pattern='data_int32*'), {'unchanged': 2, 'removed': 0})
+		self.assertEqual(len(index.files()), 4)
+		index.close()
+
+	def test_unreadable_file(self):
+		dangling = os.path.join(self.stores, 'dangling')
+		os.symlink(os.path.join(self.tmp, 'missing'), dangling)
+		index = MMKVKeyIndex()
+		summary = index.update_directory(self.stores)
+		self.assertEqual(summary, {'indexed': 3, 'encrypted': 1, 'unreadable': 1, 'removed': 0})
+		self.assertIn({'file': dangling, 'status': 'unreadable'}, index.files())
+		os.remove(dangling)
+		self.assertEqual(index.update_directory(self.stores)['removed'], 1)
+		self.assertEqual(len(index.files()), 4)
+		index.close()
+
+	def test_symlinked_store(self):
+		outside = os.path.join(self.tmp, 'outside')
+		shutil.move(os.path.join(self.stores, 'data_int32_keypair'), outside)
+		link = os.path.join(self.stores, 'data_int32_keypair')
+		os.symlink(outside, link)
+		index = MMKVKeyIndex()
+		index.update_directory(self.stores)
+		self.assertIn(link, [hit['file'] for hit in index.lookup('key')])
+		os.remove(link)
+		self.assertEqual(index.update_directory(self.stores)['removed'], 1)
+		self.assertNotIn(outside, [hit['file'] for hit in index.lookup('key')])
+		self.assertEqual(len(index.lookup('key')), 1)
+		index.close()
+
+	def test_cli(self):
+		mmkv_index.main(['build', self.stores, '--index', self.index_path])
+		with redirect_stdout(StringIO()) as output:
+			mmkv_index.main(['lookup', 'string_key', '--index', self.index_path])
+		self.assertEqual(len(json.loads(output.getvalue())), 1)
+
+
 if __name__ == "__main__":
 	unittest.main()